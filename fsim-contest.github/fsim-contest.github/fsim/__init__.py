@@ -0,0 +1,5 @@
+"""Shared building blocks for the team fault simulators.
+
+The team scripts add the contest root to ``sys.path`` and import the
+modules they need, e.g. ``from fsim import collapse``.
+"""
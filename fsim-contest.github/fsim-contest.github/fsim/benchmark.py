@@ -0,0 +1,374 @@
+"""Benchmark harness: run fault simulators over the circuit suite and compare results.
+
+Every engine is run as a subprocess on every ``data.nogit/*.bench`` circuit
+(smallest first), either with the circuit's own ``.tests`` file or with
+freshly generated random tests of the requested sizes::
+
+    python -m fsim.benchmark                              # all engines, existing tests
+    python -m fsim.benchmark -e B-cpt C -c c432 c880 -n 100 1000 --json now.json
+    python -m fsim.benchmark --baseline before.json --threshold 0.1
+    python -m fsim.benchmark --engine 'mine=my/sim.py --fast'
+
+Each run gets a fresh, empty cache directory (``$FSIM_CACHE_DIR``) unless
+``--warm`` is given, so timings include parsing and the good-machine
+simulation. The per-phase times and fault counts come from the summary the
+scripts write via :mod:`fsim.stats`; wall time and peak RSS are measured here.
+``faults_per_s`` is the size of the fault universe divided by the
+fault-simulation phase.
+
+With ``--baseline`` (a previous ``--json`` file) a run is a regression when
+its wall time grew by more than ``--threshold`` (relative, and at least
+``--min-delta`` seconds) or when it detects a different number of faults; the
+exit status is then 1.
+
+``--verify`` also diffs the detected faults of every engine against the
+``--ref`` engine on the canonical fault universe of :mod:`fsim.verify`.
+Disputed faults are re-simulated by :class:`fsim.verify.Reference`. The
+engine it contradicts is marked ``mismatch``; a run that wrote no fault list
+is ``no faults`` and, without a reference list, every run is ``unverified``.
+Under ``--verify`` only ``ok`` results are accepted, otherwise the exit status
+is 1.
+"""
+
+import argparse
+import csv
+import json
+import os
+import platform
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from .bench import parse_bench
+from .cache import load_netlist
+from .patterns import count_patterns
+from .stats import STATS_ENV
+from .verify import FAULTS_ENV, Reference, diff, load_faults
+
+ROOT = Path(__file__).resolve().parent.parent
+
+ENGINES = {
+    'A': ['team_A/3_stuck_at_fault_simulator.py'],
+    'B': ['team_B/3_stuck_at_fault_simulator.py'],
+    'B-packed': ['team_B/3_stuck_at_fault_simulator.py', '--engine', 'packed'],
+    'B-level': ['team_B/3_stuck_at_fault_simulator.py', '--engine', 'level'],
+    'B-deductive': ['team_B/3_stuck_at_fault_simulator.py', '--engine', 'deductive'],
+    'B-cpt': ['team_B/3_stuck_at_fault_simulator.py', '--engine', 'cpt'],
+    'C': ['team_C/3_stuck_at_fault_simulator_3_teamC.py'],
+    'C-codegen': ['team_C/3_stuck_at_fault_simulator_3_teamC.py', '--codegen'],
+}
+
+PHASES = ('parse', 'good', 'fault')
+FIELDS = ('engine', 'circuit', 'vectors', 'status', 'wall_s', *(f'{p}_s' for p in PHASES),
+          'peak_rss_mb', 'faults', 'detected', 'coverage', 'faults_per_s')
+
+
+def circuits(data_dir, names=None):
+    """Bench files in ``data_dir`` (or just ``names``), smallest first."""
+    if names:
+        benches = [data_dir / f'{n}.bench' for n in names]
+        missing = [str(b) for b in benches if not b.exists()]
+        if missing:
+            raise SystemExit(f'No such bench file: {", ".join(missing)}')
+    else:
+        benches = list(data_dir.glob('*.bench'))
+    return sorted(benches, key=lambda b: b.stat().st_size)
+
+
+def prepare(bench, n_vecs, work, seed=42):
+    """Copy ``bench`` into ``work`` with its tests; returns ``(bench, tests, vectors)``.
+
+    ``n_vecs`` None reuses the circuit's own ``.tests`` file, otherwise
+    ``n_vecs`` random tests are made once with :func:`make_tests`.
+    """
+    work.mkdir(parents=True, exist_ok=True)
+    dst = work / bench.name
+    if not dst.exists() or dst.read_bytes() != bench.read_bytes():
+        shutil.copyfile(bench, dst)
+    if n_vecs is None:
+        tests = work / f'{bench.stem}.tests'
+        src = bench.with_suffix('.tests')
+        if not src.exists():
+            return dst, None, 0
+        if not tests.exists() or tests.stat().st_mtime < src.stat().st_mtime:
+            shutil.copyfile(src, tests)
+    else:
+        tests = work / f'{bench.stem}.{n_vecs}.tests'
+        if not tests.exists():
+            make_tests(dst, n_vecs, tests, seed)
+    return dst, tests, count_patterns(tests)
+
+
+def make_tests(bench, n_vecs, dst, seed=42):
+    """Write ``n_vecs`` seeded random vectors for ``bench`` in ``.tests`` layout.
+
+    Like ``2_make_random_tests.py``: PI values first, one ``-`` per PO.
+    """
+    pis, pos = parse_bench(bench)[:2]
+    bits = np.random.default_rng(seed).integers(0, 2, size=(n_vecs, len(pis)), dtype=np.uint8) + ord('0')
+    tail = b'-' * len(pos) + b'\n'
+    tmp = dst.with_name(dst.name + '.tmp')
+    with open(tmp, 'wb') as f:
+        f.writelines(bytes(row) + tail for row in bits)
+    os.replace(tmp, dst)
+
+
+def _maxrss_mb(ru_maxrss):
+    return ru_maxrss / (1 << 20) if sys.platform == 'darwin' else ru_maxrss / 1024
+
+
+def run_once(cmd, env, log_path, timeout):
+    """Run ``cmd``; returns ``(status, wall_s, peak_rss_mb)``."""
+    with open(log_path, 'wb') as log:
+        t0 = time.perf_counter()
+        proc = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT, env=env, cwd=ROOT)
+        killed = threading.Event()
+        timer = threading.Timer(timeout, lambda: (killed.set(), proc.kill())) if timeout else None
+        if timer:
+            timer.start()
+        if hasattr(os, 'wait4'):
+            _, status, usage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            rss = _maxrss_mb(usage.ru_maxrss)
+        else:
+            proc.wait()
+            rss = None
+        wall = time.perf_counter() - t0
+        if timer:
+            timer.cancel()
+    if killed.is_set():
+        return 'timeout', wall, rss
+    return ('ok' if proc.returncode == 0 else f'exit {proc.returncode}'), wall, rss
+
+
+def run_engine(name, argv, bench, tests, vectors, args):
+    """Best of ``args.repeat`` runs of one engine on one circuit, as a result row."""
+    row = dict.fromkeys(FIELDS)
+    row.update(engine=name, circuit=bench.stem, vectors=vectors)
+    logs = args.work_dir / 'logs'
+    logs.mkdir(exist_ok=True)
+    log_path = logs / f'{name}.{bench.stem}.{vectors}.log'
+    cmd = [sys.executable, *argv, str(bench), str(tests)]
+    faults = faults_path(args, name, bench, vectors)
+    best = None
+    for _ in range(args.repeat):
+        with tempfile.TemporaryDirectory(dir=args.work_dir) as tmp:
+            env = dict(os.environ, **{STATS_ENV: os.path.join(tmp, 'stats.json')})
+            if not args.warm:
+                env['FSIM_CACHE_DIR'] = os.path.join(tmp, 'cache')
+            if args.verify:
+                faults.parent.mkdir(exist_ok=True)
+                faults.unlink(missing_ok=True)
+                env[FAULTS_ENV] = str(faults)
+            status, wall, rss = run_once(cmd, env, log_path, args.timeout)
+            stats = {}
+            if status == 'ok':
+                try:
+                    with open(env[STATS_ENV], encoding='utf-8') as f:
+                        stats = json.load(f)
+                except FileNotFoundError:
+                    status = 'no stats'
+        if best is not None and (status != 'ok' or wall >= best['wall_s']):
+            continue
+        row.update(status=status, wall_s=wall, peak_rss_mb=rss)
+        phases = stats.get('phases', {})
+        for p in PHASES:
+            row[f'{p}_s'] = phases.get(p)
+        row.update(faults=stats.get('faults'), detected=stats.get('detected'))
+        if row['faults']:
+            row['coverage'] = 100.0 * row['detected'] / row['faults']
+            if row['fault_s']:
+                row['faults_per_s'] = row['faults'] / row['fault_s']
+        best = row.copy()
+        if status != 'ok':
+            break
+    return best
+
+
+def faults_path(args, name, bench, vectors):
+    return args.work_dir / 'faults' / f'{name}.{bench.stem}.{vectors}.json'
+
+
+def verify(rows, bench, tests, args):
+    """Diff the fault lists of ``rows`` (one circuit and test set) against ``args.ref``.
+
+    Prints the disputed faults with the reference verdict and marks the rows
+    of the engines the reference contradicts as ``mismatch``; without a fault
+    list from ``args.ref`` nothing can be checked and every row is ``unverified``.
+    """
+    runs = {}
+    for r in rows:
+        path = faults_path(args, r['engine'], bench, r['vectors'])
+        if r['status'] == 'ok':
+            if path.exists():
+                runs[r['engine']] = load_faults(path)
+            else:
+                r['status'] = 'no faults'
+    ref_name = args.ref or rows[0]['engine']
+    if ref_name not in runs:
+        print(f'[VERIFY] no fault list from {ref_name} for {bench.stem}, nothing compared')
+        for r in rows:
+            if r['status'] == 'ok':
+                r['status'] = 'unverified'
+        return
+    reference, wrong = None, set()
+    for name, faults in runs.items():
+        if name == ref_name:
+            continue
+        only, only_ref, common = diff(faults, runs[ref_name])
+        disputed = only + only_ref
+        if not disputed:
+            continue
+        if reference is None:
+            reference = Reference(load_netlist(bench)[0], tests, bench)
+        print(f'[MISMATCH] {name} vs {ref_name} on {bench.stem} ({rows[0]["vectors"]} vectors): '
+              f'{len(disputed)} of {common} common faults differ')
+        for k, f in enumerate(disputed):
+            claims, other = (name, ref_name) if k < len(only) else (ref_name, name)
+            detected, t, vec = reference.explain(f)
+            wrong.add(other if detected else claims)
+            if k < args.max_report:
+                verdict = f'detected by vector {t}: {vec}' if detected else 'not detected by any vector'
+                print(f'  {f:<24} detected by {claims} only; reference: {verdict}')
+        if len(disputed) > args.max_report:
+            print(f'  ... {len(disputed) - args.max_report} more')
+    for r in rows:
+        if r['engine'] in wrong:
+            r['status'] = 'mismatch'
+
+
+def compare(rows, baseline, threshold, min_delta):
+    """Regressions of ``rows`` against ``baseline`` rows, as readable strings."""
+    base = {(r['engine'], r['circuit'], r['vectors']): r for r in baseline}
+    found = []
+    for r in rows:
+        b = base.get((r['engine'], r['circuit'], r['vectors']))
+        if b is None or b.get('status') != 'ok':
+            continue
+        key = f"{r['engine']} {r['circuit']} ({r['vectors']} vectors)"
+        if r['status'] != 'ok':
+            found.append(f'{key}: {r["status"]} (baseline ok)')
+            continue
+        if r['detected'] != b.get('detected'):
+            found.append(f'{key}: detected {r["detected"]}, baseline {b.get("detected")}')
+        if r['wall_s'] > b['wall_s'] * (1 + threshold) and r['wall_s'] - b['wall_s'] >= min_delta:
+            found.append(f'{key}: {r["wall_s"]:.3f} s, baseline {b["wall_s"]:.3f} s '
+                         f'(+{(r["wall_s"] / b["wall_s"] - 1) * 100:.0f}%)')
+    return found
+
+
+def _fmt(v, spec):
+    return '-' if v is None else format(v, spec)
+
+
+def print_row(r):
+    print(f"{r['engine']:<12} {r['circuit']:<7} {r['vectors']:>6} {r['status']:<8} "
+          f"{_fmt(r['wall_s'], '8.3f')} {_fmt(r['parse_s'], '7.3f')} {_fmt(r['good_s'], '7.3f')} "
+          f"{_fmt(r['fault_s'], '8.3f')} {_fmt(r['peak_rss_mb'], '7.1f')} "
+          f"{_fmt(r['coverage'], '7.2f')} {_fmt(r['faults_per_s'], '10.0f')}", flush=True)
+
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        w = csv.DictWriter(f, fieldnames=FIELDS)
+        w.writeheader()
+        w.writerows(rows)
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Run fault simulators over the benchmark circuits.')
+    ap.add_argument('-e', '--engines', nargs='+', default=None,
+                    help=f'engines to run (default: all of {", ".join(ENGINES)} and every --engine)')
+    ap.add_argument('--engine', action='append', default=[], metavar='NAME=SCRIPT [ARGS]',
+                    help='add an engine; bench and tests paths are appended to the command')
+    ap.add_argument('-c', '--circuits', nargs='+', help='circuit names (default: all in --data)')
+    ap.add_argument('-n', '--vectors', nargs='+', type=int,
+                    help='random test counts to generate (default: each circuit\'s own .tests)')
+    ap.add_argument('--seed', type=int, default=42, help='seed for the generated tests')
+    ap.add_argument('--data', type=Path, default=ROOT / 'data.nogit', help='directory of .bench/.tests files')
+    ap.add_argument('--work-dir', type=Path, default=ROOT / '.fsim-bench',
+                    help='copies of the inputs, generated tests, side outputs and logs')
+    ap.add_argument('--repeat', type=int, default=1, help='runs per measurement, the fastest is kept')
+    ap.add_argument('--timeout', type=float, default=600, help='seconds per run (0 = none)')
+    ap.add_argument('--warm', action='store_true', help='let runs share the netlist/golden cache')
+    ap.add_argument('--json', type=Path, help='write results (usable as a --baseline) here')
+    ap.add_argument('--csv', type=Path, help='write results as CSV here')
+    ap.add_argument('--baseline', type=Path, help='earlier --json output to compare against')
+    ap.add_argument('--threshold', type=float, default=0.10, help='allowed relative wall time growth')
+    ap.add_argument('--min-delta', type=float, default=0.05, help='ignore slowdowns below this many seconds')
+    ap.add_argument('--verify', action='store_true',
+                    help='diff the detected faults of all engines on a canonical fault universe')
+    ap.add_argument('--ref', help='engine the others are diffed against (default: the first one)')
+    ap.add_argument('--max-report', type=int, default=10, help='disputed faults printed per engine pair')
+    args = ap.parse_args()
+
+    engines = dict(ENGINES)
+    for spec in args.engine:
+        name, sep, cmd = spec.partition('=')
+        if not sep or not cmd.strip():
+            ap.error(f'--engine expects NAME=SCRIPT [ARGS], got {spec!r}')
+        engines[name] = shlex.split(cmd)
+    selected = args.engines or list(engines)
+    unknown = [e for e in selected if e not in engines]
+    if unknown:
+        ap.error(f'unknown engine(s): {", ".join(unknown)}')
+    if args.ref and args.ref not in selected:
+        selected.insert(0, args.ref)
+    args.work_dir = args.work_dir.resolve()
+    args.work_dir.mkdir(parents=True, exist_ok=True)
+
+    print(f"{'engine':<12} {'circuit':<7} {'vecs':>6} {'status':<8} {'wall_s':>8} {'parse_s':>7} "
+          f"{'good_s':>7} {'fault_s':>8} {'rss_mb':>7} {'cov_%':>7} {'faults/s':>10}")
+    rows = []
+    for bench in circuits(args.data, args.circuits):
+        for n_vecs in args.vectors or [None]:
+            work_bench, tests, vectors = prepare(bench, n_vecs, args.work_dir, args.seed)
+            if tests is None:
+                print(f'[SKIP] {bench.with_suffix(".tests")} not found')
+                continue
+            runs = []
+            for name in selected:
+                row = run_engine(name, engines[name], work_bench, tests, vectors, args)
+                print_row(row)
+                runs.append(row)
+            if args.verify:
+                verify(runs, work_bench, tests, args)
+            rows += runs
+
+    if args.json:
+        meta = {'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'python': platform.python_version(),
+                'machine': platform.machine(), 'cpus': os.cpu_count(), 'warm': args.warm}
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'meta': meta, 'results': rows}, f, indent=1)
+    if args.csv:
+        write_csv(args.csv, rows)
+
+    failed = False
+    if args.verify:
+        rejected = sorted({f"{r['engine']} {r['circuit']} ({r['status']})" for r in rows if r['status'] != 'ok'})
+        if rejected:
+            print(f'Not accepted: {", ".join(rejected)}')
+            failed = True
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(rows, baseline, args.threshold, args.min_delta)
+        for msg in regressions:
+            print(f'[REGRESSION] {msg}')
+        if regressions:
+            failed = True
+        else:
+            print(f'No regressions against {args.baseline} (threshold {args.threshold:.0%}).')
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
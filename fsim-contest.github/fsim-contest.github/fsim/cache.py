@@ -0,0 +1,131 @@
+"""Content-addressed on-disk cache for parsed netlists and golden responses.
+
+Entries live in ``$FSIM_CACHE_DIR`` or, by default, in ``.fsim-cache/`` next to
+the bench file. They are keyed by the SHA-256 of the bench text, so an edited
+bench misses the cache and gets re-parsed; the stale entry for the same file
+is removed when the new one is written. Entry names also carry a short hash
+of the bench's absolute path, so benches of the same name in different
+directories sharing one ``$FSIM_CACHE_DIR`` never evict each other.
+
+Golden (fault-free) values are keyed by the bench *and* the tests file and
+stored as plain ``.npy`` arrays, so later runs memory-map them instead of
+re-simulating the good machine.
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from .bench import load_netlist as parse_netlist
+from .netlist import Netlist
+
+FORMAT = 1  # bump when the on-disk layout changes
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def cache_dir(path):
+    env = os.environ.get('FSIM_CACHE_DIR')
+    return Path(env) if env else Path(path).resolve().parent / '.fsim-cache'
+
+
+def source_key(path):
+    """Short hash of the absolute path of ``path``, telling same-named files apart."""
+    return hashlib.sha256(str(Path(path).resolve()).encode()).hexdigest()[:8]
+
+
+def entry_path(path, digest, kind, suffix):
+    return cache_dir(path) / f'{Path(path).name}.{source_key(path)}.{digest[:16]}.{kind}{FORMAT}{suffix}'
+
+
+def _store(path, kind, suffix, target, write):
+    """Write via a temp file and rename, dropping older entries of the same file/kind."""
+    target.parent.mkdir(parents=True, exist_ok=True)
+    for old in target.parent.glob(f'{Path(path).name}.{source_key(path)}.*.{kind}*{suffix}'):
+        if old != target:
+            old.unlink(missing_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=target.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w+b') as f:
+            write(f)
+        os.replace(tmp, target)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def load_netlist(path, use_cache=True):
+    """Like :func:`fsim.bench.load_netlist`, but served from the cache when warm.
+
+    The timings dict has ``hash`` and ``cache`` on a hit, ``parse`` and
+    ``levelize`` on a miss.
+    """
+    if not use_cache:
+        return parse_netlist(path)
+    t0 = time.perf_counter()
+    target = entry_path(path, file_hash(path), 'netlist', '.npz')
+    t1 = time.perf_counter()
+    if target.exists():
+        cnl = Netlist.load(target)
+        return cnl, {'hash': t1 - t0, 'cache': time.perf_counter() - t1}
+    cnl, timings = parse_netlist(path)
+    _store(path, 'netlist', '.npz', target, cnl.save)
+    return cnl, {'hash': t1 - t0, **timings}
+
+
+def cached_pickle(path, kind, build, use_cache=True):
+    """Cache ``build()`` (any picklable object derived from ``path``) by content hash."""
+    if not use_cache:
+        return build()
+    target = entry_path(path, file_hash(path), kind, '.pkl')
+    if target.exists():
+        with open(target, 'rb') as f:
+            return pickle.load(f)
+    obj = build()
+    _store(path, kind, '.pkl', target, lambda f: pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL))
+    return obj
+
+
+def cached_golden(bench, tests, kind, shape, fill, use_cache=True):
+    """Golden value matrix ``kind`` of ``bench`` under ``tests``, memory-mapped when cached.
+
+    ``fill(out)`` writes the uint64 array ``out`` of ``shape`` in place; on a
+    miss it runs against the new entry's memmap, so the matrix never has to fit
+    in memory.  Values are bit-planes as in :mod:`fsim.patterns` with the
+    padding bits of the last word cleared, which makes entries of the same
+    ``kind`` interchangeable between simulators.
+
+    Returns ``(values, hit)``; ``values`` is read-only.
+    """
+    if not use_cache:
+        out = np.zeros(shape, dtype='<u8')
+        fill(out)
+        return out, False
+    digest = hashlib.sha256((file_hash(bench) + file_hash(tests)).encode()).hexdigest()
+    kind = f'{Path(tests).name}-{source_key(tests)}.{kind}'
+    target = entry_path(bench, digest, kind, '.npy')
+    if target.exists():
+        return np.load(target, mmap_mode='r'), True
+
+    def write(f):
+        np.lib.format.write_array_header_1_0(f, {'descr': '<u8', 'fortran_order': False, 'shape': shape})
+        f.flush()
+        offset = f.tell()
+        f.truncate(offset + 8 * int(np.prod(shape)))
+        out = np.memmap(f, dtype='<u8', mode='r+', offset=offset, shape=shape)
+        fill(out)
+        out.flush()
+        del out
+    _store(bench, kind, '.npy', target, write)
+    return np.load(target, mmap_mode='r'), False
@@ -0,0 +1,112 @@
+"""Per-circuit code generation: the netlist as straight-line Python.
+
+:func:`load_kernel` turns a compiled netlist into a Python module with one
+local variable per net and one bitwise expression per gate, so simulating
+it costs the interpreter only the arithmetic -- no gate list, no dispatch.
+Inversion is ``x ^ M`` with ``M`` the all-ones word, so the same code runs
+on Python ints of any width and on NumPy uint64 arrays. The module defines:
+
+* ``simulate(pis, M)`` -- the value of every net (a tuple by net id) for the
+  PI values ``pis``;
+* ``CONES`` (only with ``faults=True``) -- net id -> ``f(g, s, M)``: the
+  stuck-at injection variant of the net. It forces the net to ``s``,
+  re-evaluates its fanout cone (:meth:`fsim.cone.ConeIndex.cone`) over the
+  good values ``g`` (indexable by net id) and returns the OR of the
+  differences at the reachable POs, 0 if undetected. Nets that reach no PO
+  get no function;
+  ``CONE_GATES`` holds the number of gates each of them evaluates.
+
+Cone code grows with the summed cone sizes (about 0.9 M lines for c6288), so
+only the smallest cones up to ``max_lines`` are generated; callers fall back
+to their own propagation for nets missing from ``CONES``.
+
+Generated modules are stored as ``.py`` files in the :mod:`fsim.cache`
+directory, keyed by the bench hash, and byte-compiled right away (even under
+``PYTHONDONTWRITEBYTECODE``), so later runs only import the bytecode.
+"""
+
+import hashlib
+import importlib.util
+import py_compile
+import sys
+
+from .cache import _store, entry_path, file_hash
+from .cone import ConeIndex
+from .netlist import AND, BUF, INVERTING, NAND, NOR, NOT, OR, XNOR, XOR
+
+CONE_LINES = 250_000  # default max_lines of generated cone code
+VERSION = 2  # bump when the generated code changes, so cached kernels are regenerated
+
+_SYMBOL = {BUF: '', NOT: '', AND: ' & ', NAND: ' & ', OR: ' | ', NOR: ' | ', XOR: ' ^ ', XNOR: ' ^ '}
+
+_loaded = {}  # cache file (or bench and options) -> module, so repeated calls load once
+
+
+def _expr(op, ins):
+    e = _SYMBOL[op].join(ins) if len(ins) > 1 else ins[0]
+    if op in INVERTING:
+        return f'({e}) ^ M' if len(ins) > 1 else f'{e} ^ M'
+    return e
+
+
+def generate(cnl, faults=False, max_lines=CONE_LINES, title=''):
+    """Source text of the kernel module of ``cnl``, see the module docstring."""
+    lists = cnl.as_lists()
+    op, ptr, fanin, _, _ = lists
+    npi = cnl.n_pis
+    out = [f'# Generated by fsim.codegen{" from " + title if title else ""}; do not edit.', '',
+           'def simulate(pis, M):']
+    if npi:
+        out.append('    ' + ', '.join(f'x{i}' for i in range(npi)) + ', = pis')
+    for g, o in enumerate(op):
+        out.append(f'    x{npi + g} = ' + _expr(o, [f'x{u}' for u in fanin[ptr[g]:ptr[g + 1]]]))
+    out.append('    return (' + ''.join(f'x{i}, ' for i in range(cnl.n_nets)) + ')')
+
+    if faults:
+        idx = ConeIndex(cnl, lists)
+        cones = sorted(((idx.cone(n), n) for n in range(cnl.n_nets) if idx.observable(n)),
+                       key=lambda c: len(c[0]))
+        names = {}  # net -> cone size
+        for cone, net in cones:
+            if len(cone) > max_lines:
+                break
+            max_lines -= len(cone)
+            inside = {net} | {npi + g for g in cone}
+            out += ['', f'def c{net}(g, s, M):', f'    x{net} = s']
+            for g in cone:
+                ins = [f'x{u}' if u in inside else f'g[{u}]' for u in fanin[ptr[g]:ptr[g + 1]]]
+                out.append(f'    x{npi + g} = ' + _expr(op[g], ins))
+            out.append('    return ' + ' | '.join(f'(x{p} ^ g[{p}])' for p in idx.pos(net)))
+            names[net] = len(cone)
+        out += ['', 'CONES = {' + ', '.join(f'{n}: c{n}' for n in sorted(names)) + '}',
+                'CONE_GATES = {' + ', '.join(f'{n}: {k}' for n, k in sorted(names.items())) + '}']
+    return '\n'.join(out) + '\n'
+
+
+def _import(path):
+    mod = _loaded.get(path)
+    if mod is None:
+        spec = importlib.util.spec_from_file_location(f'fsim_kernel_{path.stem.replace(".", "_")}', path)
+        mod = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(mod)
+        _loaded[path] = mod
+    return mod
+
+
+def load_kernel(cnl, bench, faults=False, use_cache=True, max_lines=CONE_LINES):
+    """The kernel module of ``cnl`` (compiled from ``bench``), generated on a cache miss."""
+    title = str(bench)
+    if not use_cache:
+        key = (title, faults, max_lines)
+        if key not in _loaded:
+            mod = _loaded[key] = type(sys)('fsim_kernel')
+            exec(compile(generate(cnl, faults, max_lines, title), f'<kernel {bench}>', 'exec'), mod.__dict__)
+        return _loaded[key]
+    digest = hashlib.sha256(f'{file_hash(bench)}{VERSION}{max_lines if faults else ""}'.encode()).hexdigest()
+    kind = 'fkernel' if faults else 'kernel'
+    target = entry_path(bench, digest, kind, '.py')
+    if not target.exists():
+        src = generate(cnl, faults, max_lines, title).encode()
+        _store(bench, kind, '.py', target, lambda f: f.write(src))
+        py_compile.compile(str(target), doraise=True)
+    return _import(target)
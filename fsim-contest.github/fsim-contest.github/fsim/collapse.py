@@ -0,0 +1,127 @@
+"""Structural stuck-at fault collapsing (equivalence + dominance).
+
+Works on a generic line graph so every team's fault model can use it:
+
+* faults are ``(line, sa)`` pairs, ``line`` being any hashable id,
+* gates are ``(kind, in_lines, out_line)`` tuples,
+* links are ``(line_a, line_b)`` pairs carrying the same signal, e.g. a
+  stem with a single branch or a kyupy fork with one input and one output.
+
+Equivalent faults are merged into classes and the first fault of each class
+(in fault-list order) becomes its representative. With ``dominance=True``
+the output fault of an AND/NAND/OR/NOR gate that dominates an input fault is
+dropped as well, since every test for the input fault also detects it.
+"""
+
+# kind -> (controlling input value, output value when controlled)
+CONTROLLING = {'AND': (0, 0), 'NAND': (0, 1), 'OR': (1, 1), 'NOR': (1, 0)}
+# kind -> inversion of single-input gates
+INVERSION = {'BUF': 0, 'BUFF': 0, 'NOT': 1, 'INV': 1}
+
+
+def gate_kind(kind):
+    """Normalize gate names: ``'nand2'`` -> ``'NAND'``."""
+    return str(kind).upper().rstrip('0123456789')
+
+
+class CollapsedFaults:
+    """Result of :func:`collapse_faults`.
+
+    :ivar faults: the full (uncollapsed) fault list.
+    :ivar reps: representative faults to simulate, in fault-list order.
+    :ivar rep_of: full fault -> its equivalence-class representative.
+    :ivar implied_by: dropped representative -> kept representative whose
+        detection implies it (dominance collapsing only).
+    """
+    def __init__(self, faults, reps, rep_of, implied_by):
+        self.faults = faults
+        self.reps = reps
+        self.rep_of = rep_of
+        self.implied_by = implied_by
+
+    def kept_rep(self, fault):
+        """The simulated fault that stands for ``fault``."""
+        r = self.rep_of[fault]
+        while r in self.implied_by:
+            r = self.implied_by[r]
+        return r
+
+    def expand(self, detected_at):
+        """Map ``{rep: first_vector}`` back onto the full fault list.
+
+        Exact for equivalence classes; with dominance the dropped faults only
+        inherit the detection of the fault they dominate, so the expanded set
+        is a lower bound of the true uncollapsed detections.
+        """
+        out = {}
+        for f in self.faults:
+            r = self.kept_rep(f)
+            if r in detected_at:
+                out[f] = detected_at[r]
+        return out
+
+
+def collapse_faults(faults, gates, links=(), dominance=False):
+    """Collapse ``faults`` over the given gates and links, see the module docstring."""
+    faults = list(faults)
+    order = {f: i for i, f in enumerate(faults)}
+    parent = {f: f for f in faults}
+
+    def find(f):
+        while parent[f] != f:
+            parent[f] = parent[parent[f]]
+            f = parent[f]
+        return f
+
+    def union(a, b):
+        if a not in parent or b not in parent:
+            return
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            if order[rb] < order[ra]:
+                ra, rb = rb, ra
+            parent[rb] = ra
+
+    for a, b in links:
+        for sa in (0, 1):
+            union((a, sa), (b, sa))
+
+    gates = [(gate_kind(kind), list(ins), out) for kind, ins, out in gates]
+    for kind, ins, out in gates:
+        if len(ins) == 1 and kind in CONTROLLING:
+            kind = 'NOT' if CONTROLLING[kind][0] != CONTROLLING[kind][1] else 'BUF'
+        if kind in INVERSION and len(ins) == 1:
+            for sa in (0, 1):
+                union((ins[0], sa), (out, sa ^ INVERSION[kind]))
+        elif kind in CONTROLLING:
+            c, co = CONTROLLING[kind]
+            for i in ins:
+                union((i, c), (out, co))
+
+    # union() keeps the earliest fault of a class as its root
+    rep_of = {f: find(f) for f in faults}
+
+    implied_by = {}
+    if dominance:
+        def kept(r):
+            while r in implied_by:
+                r = implied_by[r]
+            return r
+        for kind, ins, out in gates:
+            if kind not in CONTROLLING or len(ins) < 2:
+                continue
+            c, co = CONTROLLING[kind]
+            dom = (out, 1 - co)
+            if dom not in rep_of:
+                continue
+            rd = rep_of[dom]
+            if rd in implied_by:
+                continue
+            for i in ins:
+                sub = (i, 1 - c)
+                if sub in rep_of and kept(rep_of[sub]) != rd:
+                    implied_by[rd] = rep_of[sub]
+                    break
+
+    reps = [f for f in faults if rep_of[f] == f and f not in implied_by]
+    return CollapsedFaults(faults, reps, rep_of, implied_by)
@@ -0,0 +1,69 @@
+"""Fanout cones and PO reachability of every net, precomputed once per netlist.
+
+A fault can only change the gates in the transitive fanout of its net, and
+only the POs that fanout reaches can show it. :class:`ConeIndex` makes both
+explicit so propagation loops never look further::
+
+    idx = ConeIndex(cnl)
+    if idx.observable(net):          # some PO is reachable at all
+        for g in idx.cone(net): ...  # fanout gates in levelized order
+        diff = any(bad[p] != good[p] for p in idx.pos(net))
+
+Reachability is one backward pass over the gates: ``reach[net]`` is the set
+of reachable PO indices as an int bitset. Gates whose output reaches no PO
+(``live[g] == 0``) can never matter, so :meth:`ConeIndex.cone` leaves them
+out. Cones are built on first use and kept, since summed over all nets they
+grow with the square of the circuit size.
+"""
+
+
+class ConeIndex:
+    """Fanout-cone and PO-reachability index of ``cnl``.
+
+    :ivar reach: per net id, bitset of the indices into ``cnl.pos`` it reaches.
+    :ivar live: per gate id, 1 if its output reaches a PO (bytearray).
+    """
+    def __init__(self, cnl, lists=None):
+        _, ptr, fanin, self._fptr, self._fanout = lists or cnl.as_lists()
+        self.n_pis = npi = cnl.n_pis
+        self._po_ids = cnl.pos.tolist()
+        reach = [0] * cnl.n_nets
+        for i, po in enumerate(self._po_ids):
+            reach[po] |= 1 << i
+        # every reader of a net has a higher gate id, so reach[out] is final here
+        for g in range(cnl.n_gates - 1, -1, -1):
+            r = reach[npi + g]
+            if r:
+                for u in fanin[ptr[g]:ptr[g + 1]]:
+                    reach[u] |= r
+        self.reach = reach
+        self.live = bytearray(1 if r else 0 for r in reach[npi:])
+        self._cones = {}
+        self._pos = {}
+
+    def observable(self, net):
+        """Whether any PO is reachable from ``net``."""
+        return self.reach[net] != 0
+
+    def cone(self, net):
+        """Gate ids in the transitive fanout of ``net`` that reach a PO, ascending (levelized)."""
+        cone = self._cones.get(net)
+        if cone is None:
+            npi, fptr, fanout, live = self.n_pis, self._fptr, self._fanout, self.live
+            seen, stack = set(), [net]
+            while stack:
+                u = stack.pop()
+                for g in fanout[fptr[u]:fptr[u + 1]]:
+                    if live[g] and g not in seen:
+                        seen.add(g)
+                        stack.append(npi + g)
+            cone = self._cones[net] = sorted(seen)
+        return cone
+
+    def pos(self, net):
+        """Net ids of the POs reachable from ``net``, in ``cnl.pos`` order."""
+        pos = self._pos.get(net)
+        if pos is None:
+            r, ids = self.reach[net], self._po_ids
+            pos = self._pos[net] = [ids[i] for i in range(r.bit_length()) if r >> i & 1]
+        return pos
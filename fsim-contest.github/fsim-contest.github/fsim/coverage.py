@@ -0,0 +1,84 @@
+"""Coverage-driven early termination and the coverage-vs-vector curve.
+
+The team scripts simulate the tests chunk by chunk. After every chunk they
+hand the number of vectors simulated so far and of faults detected to a
+:class:`Coverage`, which says when to stop: ``--target-coverage PCT`` once
+the fault coverage reaches PCT percent, ``--plateau N`` once N chunks in a
+row detected nothing new::
+
+    cov = Coverage(total_faults, args.target_coverage, args.plateau)
+    for chunk in ...:
+        ...
+        if cov.update(vectors_done, n_detected):
+            break                       # cov.reason says why
+    write_curve(args.curve, first_detect.values(), total_faults, vectors_done)
+
+``--curve FILE.csv`` writes the coverage reached after every number of
+vectors at which it changes, derived from the index of the first vector that
+detected each fault, so one run answers how many patterns a target needs.
+"""
+
+import numpy as np
+
+
+def add_arguments(ap):
+    ap.add_argument('--target-coverage', type=float, metavar='PCT',
+                    help='stop simulating further chunks once the fault coverage reaches PCT percent')
+    ap.add_argument('--plateau', type=int, default=0, metavar='N',
+                    help='stop once N chunks in a row detected no new fault')
+    ap.add_argument('--curve', metavar='FILE.csv',
+                    help='write the coverage-vs-vector curve (vectors,detected,coverage) to FILE.csv')
+
+
+class Coverage:
+    """Early-termination rule over the per-chunk coverage, see the module docstring.
+
+    :ivar reason: why :meth:`update` asked to stop, None while running.
+    """
+    def __init__(self, total, target=None, plateau=0):
+        self.total = total
+        self.target = target
+        self.plateau = plateau
+        self.reason = None
+        self._detected = 0
+        self._idle = 0
+
+    def percent(self, detected):
+        return 100.0 * detected / self.total if self.total else 100.0
+
+    def update(self, vectors, detected):
+        """Record the state after ``vectors`` vectors; True when simulation should stop."""
+        self._idle = self._idle + 1 if detected <= self._detected else 0
+        self._detected = detected
+        pct = self.percent(detected)
+        if self.target is not None and pct >= self.target:
+            self.reason = f'coverage {pct:.2f}% reached the target {self.target:g}% after {vectors} vectors'
+        elif self.plateau and self._idle >= self.plateau:
+            self.reason = f'no new detection in {self._idle} chunks, coverage {pct:.2f}% after {vectors} vectors'
+        return self.reason is not None
+
+
+def curve(first, n_vectors):
+    """``(vectors, detected)`` arrays: after ``vectors[i]`` vectors, ``detected[i]`` faults are detected.
+
+    ``first`` holds the index of the first detecting vector of every detected
+    fault; there is one point per distinct index, plus the last vector.
+    """
+    idx, counts = np.unique(np.fromiter(first, dtype=np.int64), return_counts=True)
+    vectors, detected = idx + 1, np.cumsum(counts)
+    if not len(vectors) or vectors[-1] < n_vectors:
+        vectors = np.append(vectors, n_vectors)
+        detected = np.append(detected, detected[-1] if len(detected) else 0)
+    return vectors, detected
+
+
+def write_curve(path, first, total, n_vectors):
+    """Write :func:`curve` as CSV to ``path``; no-op if ``path`` is empty."""
+    if not path:
+        return
+    vectors, detected = curve(first, n_vectors)
+    pct = 100.0 * detected / total if total else np.full(len(detected), 100.0)
+    with open(path, 'w', encoding='utf-8', newline='\n') as f:
+        f.write('vectors,detected,coverage\n')
+        for v, d, p in zip(vectors.tolist(), detected.tolist(), pct.tolist()):
+            f.write(f'{v},{d},{p:.4f}\n')
@@ -0,0 +1,86 @@
+"""Level-batched evaluation of a compiled netlist over packed words.
+
+Gates of one level never read each other, so all gates of a level with the
+same operation and fan-in count are evaluated together: one gather of their
+inputs into a ``(gates, fanin, words)`` array and one ``np.bitwise_*.reduce``
+over the fan-in axis. Inverting gates share the group of their base
+operation and are flipped with a per-gate XOR mask. The Python loop runs
+once per group, so its cost grows with the depth of the circuit (times the
+few operation/fan-in pairs per level), not with the number of gates::
+
+    plan = LevelPlan(cnl)
+    vals = plan.simulate(pi_words)   # (n_nets, n_words) uint64, by net id
+
+Values may carry more axes after the net axis, e.g. ``(n_nets, machines,
+n_words)`` to simulate many faulty machines at once; ``after`` callbacks run
+right after a given group, which is where such machines inject their faults.
+Inverting gates set the padding bits of the last word, so mask them with
+:func:`fsim.patterns.valid_mask` where it matters.
+"""
+
+import numpy as np
+
+from .netlist import AND, BUF, INVERTING, NAND, NOR, NOT, OR, XNOR, XOR
+
+# base operation of every opcode, indexed by opcode
+_BASE = np.zeros(8, dtype=np.uint8)
+_BASE[[BUF, NOT]] = BUF
+_BASE[[AND, NAND]] = AND
+_BASE[[OR, NOR]] = OR
+_BASE[[XOR, XNOR]] = XOR
+_REDUCE = {AND: np.bitwise_and, OR: np.bitwise_or, XOR: np.bitwise_xor}
+
+
+class LevelPlan:
+    """The gates of ``cnl`` cut into (level, base operation, fan-in) groups.
+
+    :ivar groups: ``(reduce, outs, ins, inv)`` per group in level order:
+        the ufunc (None for BUF/NOT), output net ids ``(k,)``, input net ids
+        ``(k, fanin)`` and the XOR mask ``(k,)`` of inverting gates (None if
+        the group has none).
+    :ivar group_of: group index per gate.
+    """
+    def __init__(self, cnl):
+        self.n_pis = cnl.n_pis
+        self.n_nets = cnl.n_nets
+        self.n_gates = cnl.n_gates
+        self.groups = []
+        self.group_of = np.zeros(cnl.n_gates, dtype=np.int32)
+        if not cnl.n_gates:
+            return
+        base = _BASE[cnl.op]
+        n_in = np.diff(cnl.fanin_ptr)
+        order = np.lexsort((n_in, base, cnl.level))
+        keys = np.stack((cnl.level[order], base[order], n_in[order]))
+        cuts = np.flatnonzero((keys[:, 1:] != keys[:, :-1]).any(axis=0)) + 1
+        inverting = np.isin(cnl.op, list(INVERTING))
+        for i, gates in enumerate(np.split(order, cuts)):
+            self.group_of[gates] = i
+            k = int(n_in[gates[0]])
+            ins = cnl.fanin[cnl.fanin_ptr[gates][:, np.newaxis] + np.arange(k)].astype(np.intp)
+            inv = None
+            if inverting[gates].any():
+                inv = np.where(inverting[gates], ~np.uint64(0), np.uint64(0))
+            self.groups.append((_REDUCE.get(int(base[gates[0]])), (self.n_pis + gates).astype(np.intp),
+                                ins, inv))
+
+    def simulate(self, pi_words, out=None, after=None):
+        """Value of every net for the packed PI words ``(n_pis, n_words)``.
+
+        Writes into ``out`` (``(n_nets, ...)`` uint64, ``pi_words`` is
+        broadcast into its PI rows) when given. ``after`` maps group indices
+        to callables ``f(out)`` run once that group has been evaluated.
+        """
+        if out is None:
+            out = np.empty((self.n_nets,) + pi_words.shape[1:], dtype=np.uint64)
+        out[:self.n_pis] = pi_words
+        extra = (1,) * (out.ndim - 1)
+        for i, (reduce, outs, ins, inv) in enumerate(self.groups):
+            x = out[ins]  # (k, fanin, ...)
+            v = reduce.reduce(x, axis=1) if reduce is not None else x[:, 0]
+            if inv is not None:
+                v ^= inv.reshape(inv.shape + extra)
+            out[outs] = v
+            if after and i in after:
+                after[i](out)
+        return out
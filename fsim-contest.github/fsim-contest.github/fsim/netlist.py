@@ -0,0 +1,173 @@
+"""Compiled, integer-indexed and levelized netlist for the hot simulation loops.
+
+Nets are numbered densely: primary inputs first (``0 .. n_pis-1``), then the
+output net of every gate in levelized order, so gate ``g`` drives net
+``n_pis + g`` and a plain array indexed by net id holds all signal values.
+Gate types are small opcodes, fanin and fanout are CSR arrays (NumPy int32)
+and every gate stores its level (PIs are level 0).
+"""
+
+import numpy as np
+
+BUF, NOT, AND, NAND, OR, NOR, XOR, XNOR = range(8)
+OPCODES = {'BUF': BUF, 'BUFF': BUF, 'NOT': NOT, 'AND': AND, 'NAND': NAND,
+           'OR': OR, 'NOR': NOR, 'XOR': XOR, 'XNOR': XNOR}
+OPNAMES = ('BUF', 'NOT', 'AND', 'NAND', 'OR', 'NOR', 'XOR', 'XNOR')
+INVERTING = frozenset((NOT, NAND, NOR, XNOR))
+
+
+class Netlist:
+    """A compiled netlist, see the module docstring for the numbering.
+
+    :ivar names: net id -> original net name.
+    :ivar n_pis: number of primary inputs (net ids ``0 .. n_pis-1``).
+    :ivar pos: net ids of the primary outputs (int32).
+    :ivar op: opcode per gate (uint8).
+    :ivar level: level per gate (int32), non-decreasing over gate ids.
+    :ivar fanin_ptr, fanin: CSR of input net ids per gate.
+    :ivar fanout_ptr, fanout: CSR of reading gate ids per net.
+    :ivar gate_src: gate id -> position of the gate in the compiler input.
+    """
+    def __init__(self, names, n_pis, pos, op, level, fanin_ptr, fanin, gate_src,
+                 fanout_ptr=None, fanout=None):
+        self.names = list(names)
+        self.n_pis = int(n_pis)
+        self.pos = np.asarray(pos, dtype=np.int32)
+        self.op = np.asarray(op, dtype=np.uint8)
+        self.level = np.asarray(level, dtype=np.int32)
+        self.fanin_ptr = np.asarray(fanin_ptr, dtype=np.int32)
+        self.fanin = np.asarray(fanin, dtype=np.int32)
+        self.gate_src = np.asarray(gate_src, dtype=np.int32)
+        if fanout_ptr is None:
+            fanout_ptr, fanout = _transpose(self.fanin_ptr, self.fanin, self.n_nets)
+        self.fanout_ptr = np.asarray(fanout_ptr, dtype=np.int32)
+        self.fanout = np.asarray(fanout, dtype=np.int32)
+        self._ids = None
+
+    def __repr__(self):
+        return (f'{{nets: {self.n_nets}, pis: {self.n_pis}, pos: {len(self.pos)}, '
+                f'gates: {self.n_gates}, levels: {self.depth}}}')
+
+    @property
+    def n_gates(self):
+        return len(self.op)
+
+    @property
+    def n_nets(self):
+        return self.n_pis + self.n_gates
+
+    @property
+    def depth(self):
+        return int(self.level[-1]) if self.n_gates else 0
+
+    def net_id(self, name):
+        if self._ids is None:
+            self._ids = {n: i for i, n in enumerate(self.names)}
+        return self._ids[name]
+
+    def gate_ins(self, g):
+        return self.fanin[self.fanin_ptr[g]:self.fanin_ptr[g + 1]]
+
+    def readers(self, net):
+        return self.fanout[self.fanout_ptr[net]:self.fanout_ptr[net + 1]]
+
+    def iter_gates(self):
+        """Yield ``(out, type, ins)`` by net name, in levelized order."""
+        op, ptr, fanin, _, _ = self.as_lists()
+        names = self.names
+        for g, o in enumerate(op):
+            yield names[self.n_pis + g], OPNAMES[o], [names[u] for u in fanin[ptr[g]:ptr[g + 1]]]
+
+    def save(self, f):
+        """Write all arrays to ``f`` (path or file object) in ``.npz`` format."""
+        np.savez(f, names=np.array([str(n) for n in self.names]), n_pis=self.n_pis, pos=self.pos,
+                 op=self.op, level=self.level, fanin_ptr=self.fanin_ptr, fanin=self.fanin,
+                 gate_src=self.gate_src, fanout_ptr=self.fanout_ptr, fanout=self.fanout)
+
+    @classmethod
+    def load(cls, f):
+        with np.load(f) as z:
+            return cls(z['names'].tolist(), int(z['n_pis']), z['pos'], z['op'], z['level'],
+                       z['fanin_ptr'], z['fanin'], z['gate_src'], z['fanout_ptr'], z['fanout'])
+
+    def as_lists(self):
+        """``(op, fanin_ptr, fanin, fanout_ptr, fanout)`` as Python lists.
+
+        Scalar hot loops index lists much faster than NumPy arrays.
+        """
+        return (self.op.tolist(), self.fanin_ptr.tolist(), self.fanin.tolist(),
+                self.fanout_ptr.tolist(), self.fanout.tolist())
+
+
+def _transpose(ptr, idx, n_rows):
+    """Invert a gate -> net CSR into a net -> gate CSR (gate ids stay sorted)."""
+    counts = np.diff(ptr)
+    gates = np.repeat(np.arange(len(counts), dtype=np.int32), counts)
+    order = np.argsort(idx, kind='stable')
+    tptr = np.zeros(n_rows + 1, dtype=np.int32)
+    np.cumsum(np.bincount(idx, minlength=n_rows), out=tptr[1:])
+    return tptr, gates[order]
+
+
+def compile_netlist(pis, pos, gates):
+    """Compile parsed ``.bench`` data.
+
+    :param pis: primary input net names in declaration order.
+    :param pos: primary output net names in declaration order.
+    :param gates: iterable of ``(out, type, ins)`` in any order.
+    """
+    gates = list(gates)
+    pi_id = {n: i for i, n in enumerate(pis)}
+    driver = {}
+    for k, (out, _, _) in enumerate(gates):
+        if out in driver or out in pi_id:
+            raise ValueError(f'Net {out!r} has more than one driver.')
+        driver[out] = k
+
+    # Kahn levelization, linear in the number of pins
+    indeg = [0] * len(gates)
+    succ = [[] for _ in gates]
+    for k, (_, gtype, ins) in enumerate(gates):
+        if gtype.upper() not in OPCODES:
+            raise ValueError(f'Unsupported gate: {gtype}')
+        for u in ins:
+            if u in driver:
+                indeg[k] += 1
+                succ[driver[u]].append(k)
+            elif u not in pi_id:
+                raise ValueError(f'Net {u!r} has no driver.')
+    level = [1] * len(gates)
+    queue = [k for k, d in enumerate(indeg) if d == 0]
+    for k in queue:
+        for s in succ[k]:
+            if level[s] <= level[k]:
+                level[s] = level[k] + 1
+            indeg[s] -= 1
+            if indeg[s] == 0:
+                queue.append(s)
+    if len(queue) != len(gates):
+        raise ValueError('Netlist is not a DAG (combinational loop).')
+
+    buckets = [[] for _ in range(max(level, default=0) + 1)]
+    for k in range(len(gates)):
+        buckets[level[k]].append(k)
+    order = [k for b in buckets for k in b]
+
+    names = list(pis)
+    net_id = dict(pi_id)
+    for k in order:
+        net_id[gates[k][0]] = len(names)
+        names.append(gates[k][0])
+
+    fanin_ptr = [0]
+    fanin, op = [], []
+    for k in order:
+        out, gtype, ins = gates[k]
+        op.append(OPCODES[gtype.upper()])
+        fanin.extend(net_id[u] for u in ins)
+        fanin_ptr.append(len(fanin))
+    try:
+        po_ids = [net_id[n] for n in pos]
+    except KeyError as e:
+        raise ValueError(f'Output net {e.args[0]!r} has no driver.') from None
+    return Netlist(names, len(pis), po_ids, op, [level[k] for k in order], fanin_ptr, fanin, order)
@@ -0,0 +1,117 @@
+"""Fault-partitioned simulation on a process pool.
+
+The fault list is cut into contiguous chunks. A :class:`FaultPool` lives for
+a whole run: every worker builds the per-run state (netlist, cone index, ...)
+once in the pool initializer. Each :meth:`FaultPool.map` call then hands
+the workers a batch -- typically the good values of one chunk of test
+vectors, passed as a :class:`fsim.shm.SharedArray` handle -- which
+``prepare(state, *data)`` turns into the task state once per worker and
+batch, and runs ``task(task_state, chunk)`` for the fault chunks::
+
+    with SharedBuffer(nbytes, jobs) as buf, FaultPool(jobs, setup, (cnl,), task, prepare) as pool:
+        for good, n in chunks():
+            parts = pool.map(todo, buf.put(good), n)   # prepare(state, good_ref, n)
+
+Results come back in chunk order, so merging them reproduces a serial run
+exactly as long as the task treats every fault independently.
+
+Hot-path counters (:data:`fsim.stats.counters`) incremented in the workers are
+sent back with each chunk and added to the parent's.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from .stats import counters
+
+_state = None
+_task = None
+_prepare = None
+_batch = None  # (batch number, prepared task state) in a worker
+
+
+def _init(setup, setup_args, task, prepare):
+    global _state, _task, _prepare
+    _state = setup(*setup_args)
+    _task = task
+    _prepare = prepare
+
+
+def _run(job):
+    global _batch
+    key, data, chunk = job
+    if _batch is None or _batch[0] != key:
+        _batch = None  # drop the previous batch's views before preparing the next
+        _batch = key, _prepare(_state, *data) if _prepare else _state
+    counters.clear()
+    return _task(_batch[1], chunk), dict(counters)
+
+
+def resolve_jobs(jobs):
+    """``0`` (or less) means one job per CPU."""
+    return jobs if jobs and jobs > 0 else (os.cpu_count() or 1)
+
+
+def split(items, n):
+    """Cut ``items`` into at most ``n`` contiguous, nearly equal chunks."""
+    items = list(items)
+    n = max(1, min(n, len(items)))
+    step, extra = divmod(len(items), n)
+    chunks, start = [], 0
+    for i in range(n):
+        end = start + step + (i < extra)
+        chunks.append(items[start:end])
+        start = end
+    return chunks
+
+
+class FaultPool:
+    """Worker processes kept for a whole run, see the module docstring.
+
+    ``setup``, ``task``, ``prepare`` and ``setup_args`` must be picklable
+    (module-level functions); the per-batch ``data`` should be small (handles,
+    counts). With ``jobs == 1`` everything runs in-process and nothing is
+    pickled.
+    """
+    def __init__(self, jobs, setup, setup_args, task, prepare=None, chunks_per_job=4):
+        self.jobs = resolve_jobs(jobs)
+        self.task = task
+        self.prepare = prepare
+        self.chunks_per_job = chunks_per_job
+        self._batches = 0
+        if self.jobs == 1:
+            self._state, self._ex = setup(*setup_args), None
+        else:
+            self._ex = ProcessPoolExecutor(self.jobs, initializer=_init,
+                                           initargs=(setup, setup_args, task, prepare))
+
+    def map(self, faults, *data):
+        """Run the task over ``faults`` for the batch ``data``; returns per-chunk results in order."""
+        self._batches += 1
+        if self._ex is None:
+            state = self.prepare(self._state, *data) if self.prepare else self._state
+            return [self.task(state, list(faults))]
+        results = []
+        jobs = [(self._batches, data, c) for c in split(faults, self.jobs * self.chunks_per_job)]
+        for res, counts in self._ex.map(_run, jobs):
+            counters.update(counts)
+            results.append(res)
+        return results
+
+    def close(self):
+        if self._ex is not None:
+            self._ex.shutdown()
+            self._ex = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def merge_dicts(parts):
+    out = {}
+    for p in parts:
+        out.update(p)
+    return out
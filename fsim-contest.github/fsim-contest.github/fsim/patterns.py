@@ -0,0 +1,248 @@
+"""Streaming readers for test pattern files.
+
+A ``.tests`` file has one vector per line; its first ``n_pis`` characters are
+the PI values (``0``/``1``) in declaration order, anything after them (the
+``--`` output placeholders) is ignored and blank lines are skipped. A line
+shorter than ``n_pis`` is an error rather than skipped (as the original
+team_B reader did), so vector indices always match the file's lines.
+
+The file is memory-mapped and vectors are packed straight into bit-planes,
+``chunk`` vectors at a time, so only one chunk is ever held in memory::
+
+    for planes, n in iter_tests(path, n_pis):
+        ...   # planes: (n_pis, ceil(n / 64)) little-endian uint64
+
+Bit ``t % 64`` of word ``t // 64`` in row ``i`` is PI ``i`` under the ``t``-th
+vector of the chunk; the padding bits of the last word are zero.
+
+The binary ``.tpk`` format stores exactly that layout for the whole file: a
+64-byte little-endian header (magic, version, PI count, vector count and the
+SHA-256 of the bench it was made for) followed by ``n_pis`` rows of
+``ceil(n_vecs / 64)`` uint64 words.  It is memory-mapped and chunks are
+column slices of the map, so nothing is parsed or copied.  Convert with::
+
+    python -m fsim.patterns pack   c7552.tests c7552.tpk [--bench c7552.bench]
+    python -m fsim.patterns unpack c7552.tpk c7552.tests [--bench c7552.bench]
+
+:func:`iter_patterns` reads either format, telling them apart by the magic.
+"""
+
+import argparse
+import mmap
+import os
+
+import numpy as np
+
+from .bench import parse_bench
+from .cache import file_hash
+
+WORD_BITS = 64
+CHUNK = 4096  # vectors per chunk, a multiple of WORD_BITS
+
+MAGIC = b'FSIMTPK\0'
+VERSION = 1
+HEADER = np.dtype([('magic', 'S8'), ('version', '<u4'), ('n_pis', '<u4'), ('n_vecs', '<u8'),
+                   ('bench_hash', 'u1', (32,)), ('reserved', 'V8')])
+
+
+def valid_mask(n):
+    """Word mask of the ``n`` used bits of a chunk (padding bits cleared)."""
+    valid = np.full((n + WORD_BITS - 1) // WORD_BITS, ~np.uint64(0), dtype=np.uint64)
+    if n % WORD_BITS:
+        valid[-1] = np.uint64((1 << (n % WORD_BITS)) - 1)
+    return valid
+
+
+def pack_rows(rows, n, n_pis):
+    """Pack ``n`` rows of ``n_pis`` ASCII ``0``/``1`` bytes into bit-planes."""
+    bits = np.frombuffer(rows, dtype=np.uint8).reshape(n, n_pis) - ord('0')
+    if (bits > 1).any():
+        raise ValueError('Test vectors may only contain 0 and 1 on the PIs.')
+    n_words = (n + WORD_BITS - 1) // WORD_BITS
+    planes = np.zeros((n_pis, n_words * WORD_BITS), dtype=np.uint8)
+    planes[:, :n] = bits.T
+    return np.packbits(planes, axis=1, bitorder='little').view('<u8')
+
+
+def chunk_size(chunk):
+    """Round ``chunk`` up to whole words, so chunk k always starts at word k * chunk / 64."""
+    return max(1, (chunk + WORD_BITS - 1) // WORD_BITS) * WORD_BITS
+
+
+def iter_tests(path, n_pis, chunk=CHUNK):
+    """Yield ``(planes, n)`` for consecutive chunks of up to ``chunk`` vectors."""
+    chunk = chunk_size(chunk)
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            rows, n, count, pos, size = bytearray(), 0, 0, 0, len(mm)
+            while pos < size:
+                end = mm.find(b'\n', pos)
+                if end < 0:
+                    end = size
+                line = mm[pos:end].strip()
+                pos = end + 1
+                if not line:
+                    continue
+                if len(line) < n_pis:
+                    raise ValueError(f'{path}: vector {count} has {len(line)} values, expected {n_pis}.')
+                rows += line[:n_pis]
+                n += 1
+                count += 1
+                if n == chunk:
+                    yield pack_rows(rows, n, n_pis), n
+                    rows, n = bytearray(), 0
+            if n:
+                yield pack_rows(rows, n, n_pis), n
+
+
+def count_tests(path):
+    """Number of vectors (non-blank lines) in a ``.tests`` file."""
+    with open(path, 'rb') as f:
+        return sum(1 for line in f if line.strip())
+
+
+def count_patterns(path):
+    """Number of vectors in a ``.tests`` or ``.tpk`` file (the header for the latter)."""
+    if is_packed(path):
+        return int(np.fromfile(path, dtype=HEADER, count=1)['n_vecs'][0])
+    return count_tests(path)
+
+
+def is_packed(path):
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def open_packed(path, n_pis=None, bench=None):
+    """Map a ``.tpk`` file; returns ``(planes, n_vecs)`` with planes a read-only memmap.
+
+    Raises ValueError if it does not match ``n_pis`` or was made for another
+    version of ``bench``.
+    """
+    head = np.fromfile(path, dtype=HEADER, count=1)
+    if len(head) != 1 or head['magic'][0] != MAGIC.rstrip(b'\0'):
+        raise ValueError(f'{path}: not a packed pattern file.')
+    head = head[0]
+    if head['version'] != VERSION:
+        raise ValueError(f'{path}: unsupported format version {head["version"]}.')
+    if n_pis is not None and head['n_pis'] != n_pis:
+        raise ValueError(f'{path}: patterns have {head["n_pis"]} PIs, circuit has {n_pis}.')
+    digest = bytes(head['bench_hash'])
+    if bench is not None and any(digest) and digest != bytes.fromhex(file_hash(bench)):
+        raise ValueError(f'{path}: patterns were made for a different version of {bench}.')
+    n_vecs = int(head['n_vecs'])
+    n_words = (n_vecs + WORD_BITS - 1) // WORD_BITS
+    if not n_vecs:
+        return np.zeros((int(head['n_pis']), 0), dtype='<u8'), 0
+    planes = np.memmap(path, dtype='<u8', mode='r', offset=HEADER.itemsize,
+                       shape=(int(head['n_pis']), n_words))
+    return planes, n_vecs
+
+
+def iter_packed(path, n_pis, chunk=CHUNK, bench=None):
+    """Like :func:`iter_tests` for a ``.tpk`` file; chunks are views into the map."""
+    planes, n_vecs = open_packed(path, n_pis, bench)
+    step = chunk_size(chunk)
+    for t0 in range(0, n_vecs, step):
+        n = min(step, n_vecs - t0)
+        yield planes[:, t0 // WORD_BITS:(t0 + n + WORD_BITS - 1) // WORD_BITS], n
+
+
+def iter_patterns(path, n_pis, chunk=CHUNK, bench=None):
+    """Chunks of a ``.tests`` or ``.tpk`` file; ``bench`` is used to check a ``.tpk``."""
+    if is_packed(path):
+        return iter_packed(path, n_pis, chunk, bench)
+    return iter_tests(path, n_pis, chunk)
+
+
+def pack_file(src, dst, n_pis=None, bench=None):
+    """Convert a ``.tests`` file to ``.tpk``; returns the number of vectors.
+
+    ``n_pis`` defaults to the number of leading ``0``/``1`` values of the
+    first vector (the ``-`` PO placeholders after them are not counted), or
+    the bench's PI count when ``bench`` is given (its hash is then stored in
+    the header).
+    """
+    if bench is not None:
+        n_pis = len(parse_bench(bench)[0])
+    if n_pis is None:
+        with open(src, 'rb') as f:
+            first = next((line.strip() for line in f if line.strip()), b'')
+        n_pis = len(first) - len(first.lstrip(b'01'))
+    n_vecs = count_tests(src)
+    with open(dst, 'wb') as f:
+        _header(n_pis, n_vecs, bench).tofile(f)
+        f.truncate(HEADER.itemsize + n_pis * ((n_vecs + WORD_BITS - 1) // WORD_BITS) * 8)
+    if n_vecs:
+        out = np.memmap(dst, dtype='<u8', mode='r+', offset=HEADER.itemsize,
+                        shape=(n_pis, (n_vecs + WORD_BITS - 1) // WORD_BITS))
+        w0 = 0
+        for planes, n in iter_tests(src, n_pis):
+            out[:, w0:w0 + planes.shape[1]] = planes
+            w0 += planes.shape[1]
+        out.flush()
+        del out
+    return n_vecs
+
+
+def _header(n_pis, n_vecs, bench=None):
+    head = np.zeros(1, dtype=HEADER)
+    head['magic'], head['version'], head['n_pis'], head['n_vecs'] = MAGIC, VERSION, n_pis, n_vecs
+    if bench is not None:
+        head['bench_hash'] = np.frombuffer(bytes.fromhex(file_hash(bench)), dtype=np.uint8)
+    return head
+
+
+def save_patterns(path, planes, n_vecs, bench=None):
+    """Write ``n_vecs`` vectors held as bit-planes to ``path``.
+
+    A name ending in ``.tpk`` gets the packed format (with the hash of
+    ``bench``), anything else a ``.tests`` file (with one ``-`` per PO of
+    ``bench``).
+    """
+    n_pis = len(planes)
+    planes = np.ascontiguousarray(planes[:, :(n_vecs + WORD_BITS - 1) // WORD_BITS], dtype='<u8')
+    if str(path).endswith('.tpk'):
+        with open(path, 'wb') as f:
+            _header(n_pis, n_vecs, bench).tofile(f)
+            (planes & valid_mask(n_vecs)).tofile(f)
+        return
+    tail = b'-' * (len(parse_bench(bench)[1]) if bench is not None else 0) + b'\n'
+    bits = np.unpackbits(planes.view(np.uint8), axis=1, bitorder='little')[:, :n_vecs]
+    with open(path, 'wb') as f:
+        f.writelines(bytes(row) + tail for row in (bits.T + ord('0')))
+
+
+def unpack_file(src, dst, n_pos=0):
+    """Convert a ``.tpk`` file back to ``.tests``, appending ``n_pos`` ``-`` per line."""
+    planes, _ = open_packed(src)
+    tail = b'-' * n_pos + b'\n'
+    with open(dst, 'wb') as f:
+        for chunk, n in iter_packed(src, len(planes)):
+            bits = np.unpackbits(chunk.view(np.uint8), axis=1, bitorder='little')[:, :n]
+            f.writelines(bytes(row) + tail for row in (bits.T + ord('0')))
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Convert between .tests text and packed .tpk patterns.')
+    ap.add_argument('mode', choices=('pack', 'unpack'))
+    ap.add_argument('src')
+    ap.add_argument('dst')
+    ap.add_argument('--bench', help='pack: take the PI count from and record the hash of this bench; '
+                                    'unpack: append one - per PO of this bench')
+    args = ap.parse_args()
+    if args.mode == 'pack':
+        n = pack_file(args.src, args.dst, bench=args.bench)
+        print(f'Packed {n} vectors -> {args.dst}')
+    else:
+        n_pos = 0
+        if args.bench:
+            n_pos = len(parse_bench(args.bench)[1])
+        unpack_file(args.src, args.dst, n_pos)
+        print(f'Unpacked -> {args.dst}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Seeded random test patterns generated in process, fused with fault simulation.
+
+Instead of writing a ``.tests`` file with ``2_make_random_tests.py`` and
+parsing it back in another process, ``--random N`` makes the team scripts
+draw the vectors themselves, chunk by chunk, as the same packed bit-planes
+:func:`fsim.patterns.iter_patterns` yields. ``N`` is the vector budget;
+with ``--target-coverage`` or ``--plateau`` (:mod:`fsim.coverage`) the
+generation stops as soon as the goal is met::
+
+    useful = Useful(n_pis)
+    for planes, n in iter_random(n_pis, args.random, args.seed, args.chunk):
+        ...                            # good values, fault simulation
+        useful.add(planes, first)      # chunk-relative first-detect indices
+    useful.save(args.save_useful, bench)
+
+The stream is drawn 64 vectors (one word per PI) at a time, so vector ``t``
+is the same whatever the chunk size; it is not the stream of
+``2_make_random_tests.py``. ``--save-useful FILE`` keeps only the vectors
+that were the first to detect some fault, in their original order:
+replayed from the file they detect every fault the run detected. It works
+for tests read from a file too.
+"""
+
+import numpy as np
+
+from .patterns import CHUNK, WORD_BITS, chunk_size, save_patterns, valid_mask
+
+SEED = 42  # the seed of 2_make_random_tests.py
+
+
+def add_arguments(ap):
+    ap.add_argument('--random', type=int, metavar='N',
+                    help='simulate up to N seeded random vectors generated in process instead of a tests file')
+    ap.add_argument('--seed', type=int, default=SEED, help=f'random seed for --random (default {SEED})')
+    ap.add_argument('--save-useful', metavar='FILE',
+                    help='write the vectors that first detected some fault to FILE (.tpk packed, else .tests)')
+
+
+def check_arguments(ap, args):
+    """Exactly one of the ``tests`` argument and ``--random`` must be given."""
+    if (args.tests is None) == (args.random is None):
+        ap.error('give either a tests file or --random N')
+    if args.random is not None and args.random <= 0:
+        ap.error('--random needs a positive number of vectors')
+
+
+def iter_random(n_pis, n_vecs, seed=SEED, chunk=CHUNK):
+    """Yield ``(planes, n)`` chunks of ``n_vecs`` random vectors, like :func:`fsim.patterns.iter_tests`."""
+    rng = np.random.default_rng(seed)
+    step = chunk_size(chunk)
+    for t0 in range(0, n_vecs, step):
+        n = min(step, n_vecs - t0)
+        words = rng.integers(0, 1 << 64, size=((n + WORD_BITS - 1) // WORD_BITS, n_pis), dtype=np.uint64)
+        yield np.ascontiguousarray(words.T) & valid_mask(n), n
+
+
+class Useful:
+    """The vectors that first detected some fault, collected chunk by chunk."""
+    def __init__(self, n_pis):
+        self.n_pis = n_pis
+        self._bits = []
+        self.count = 0
+
+    def add(self, planes, first):
+        """Keep the vectors at the chunk-relative indices ``first`` (duplicates are fine) of ``planes``."""
+        t = np.unique(np.fromiter(first, dtype=np.int64))
+        if len(t):
+            planes = np.asarray(planes, dtype=np.uint64)
+            word, bit = t // WORD_BITS, (t % WORD_BITS).astype(np.uint64)
+            self._bits.append(((planes[:, word] >> bit) & np.uint64(1)).astype(np.uint8))
+            self.count += len(t)
+
+    def save(self, path, bench=None):
+        """Write the kept vectors to ``path`` (see :func:`fsim.patterns.save_patterns`).
+
+        No-op if ``path`` is empty or no vector was kept; returns whether a file was written.
+        """
+        if not path or not self.count:
+            return False
+        bits = np.concatenate(self._bits, axis=1)
+        n_words = (self.count + WORD_BITS - 1) // WORD_BITS
+        padded = np.zeros((self.n_pis, n_words * WORD_BITS), dtype=np.uint8)
+        padded[:, :self.count] = bits
+        planes = np.packbits(padded, axis=1, bitorder='little').view('<u8')
+        save_patterns(path, planes, self.count, bench)
+        return True
@@ -0,0 +1,222 @@
+"""Static identification of untestable stuck-at faults.
+
+A fault that no test can detect is never dropped by fault simulation, so it
+costs the most of all: it is re-simulated against every vector. This module
+proves such faults untestable from the netlist alone, before simulation:
+
+* unobservable -- no PO is reachable from the site (:mod:`fsim.cone`);
+* unactivatable -- the site is a constant equal to the stuck-at value;
+* unpropagatable -- the activation value together with the conditions every
+  test has to meet conflicts under direct implication.
+
+The conditions come from unique sensitization: every path from the site to
+any PO runs through its post-dominators, so each post-dominator gate with a
+controlling value needs its side inputs (those outside the fanout cone of the
+site) at the non-controlling value, and so does the faulty gate itself for a
+branch fault. Implication runs forwards and backwards over the gates on
+three-valued net values (0, 1, unknown); a net forced to both 0 and 1 is a
+conflict. Constants are found the same way once up front: a net that cannot
+take a value is constant at the other one, and the constants seed every
+later query::
+
+    red = Redundancy(cnl)
+    red.stem(net, sa)              # fault on the net itself
+    red.branch(gate, pin, sa)      # fault on input pin of a gate
+    red.fault('G7>G22:1/SA0')      # canonical fsim.verify fault name
+
+All checks are sufficient conditions only: True means proven untestable,
+False means not proven (the fault may still be redundant). Checks are
+memoized per fault. The team scripts (``--untestable``) run them once on
+the collapsed fault list before the first chunk, so a proven fault is never
+simulated and the testable coverage is taken over exactly the simulated faults.
+"""
+
+from .cone import ConeIndex
+from .netlist import AND, INVERTING, NAND, NOR, OR
+from .verify import parse_fault
+
+X = 2  # unknown net value
+IMPLY_LIMIT = 256  # nets implied per query before giving up (the fault stays unproven)
+
+# opcode -> controlling input value
+CONTROLLING = {AND: 0, NAND: 0, OR: 1, NOR: 1}
+
+
+class Conflict(Exception):
+    pass
+
+
+class Redundancy:
+    """Untestable-fault checks on ``cnl``, see the module docstring.
+
+    :ivar constants: net id -> constant value proven for it.
+    """
+    def __init__(self, cnl, idx=None, limit=IMPLY_LIMIT):
+        self.cnl = cnl
+        self.limit = limit
+        self.lists = cnl.as_lists()
+        self.idx = idx or ConeIndex(cnl, self.lists)
+        self.n_pis = npi = cnl.n_pis
+        op, ptr, fanin, fptr, fanout = self.lists
+        # per gate: controlling value (X for the parity gates) and inversion,
+        # its input nets; per net: the gates implication has to revisit
+        self._kinds = [(CONTROLLING.get(o, X), int(o in INVERTING)) for o in op]
+        self._gins = [fanin[ptr[g]:ptr[g + 1]] for g in range(cnl.n_gates)]
+        self._touch = [([n - npi] if n >= npi else []) + fanout[fptr[n]:fptr[n + 1]]
+                       for n in range(cnl.n_nets)]
+        self.vals = bytearray([X] * cnl.n_nets)
+        self._memo = {}
+
+        # immediate post-dominator of every net over the PO-reaching readers;
+        # SINK stands for "any PO" and has the highest id, so the walk up
+        # always advances the lower of two candidates
+        live, sink = self.idx.live, cnl.n_nets
+        is_po = bytearray(cnl.n_nets)
+        for p in cnl.pos.tolist():
+            is_po[p] = 1
+        ipdom = [None] * cnl.n_nets
+        for n in range(cnl.n_nets - 1, -1, -1):
+            succ = [npi + g for g in fanout[fptr[n]:fptr[n + 1]] if live[g]]
+            if is_po[n]:
+                succ.append(sink)
+            if not succ:
+                continue
+            d = succ[0]
+            for s in succ[1:]:
+                while d != s:
+                    if d < s:
+                        d = ipdom[d]
+                    else:
+                        s = ipdom[s]
+            ipdom[n] = d
+        self.sink, self.ipdom = sink, ipdom
+
+        self.constants = {}
+        for n in range(cnl.n_nets):
+            if self.vals[n] != X or not self.idx.observable(n):
+                continue
+            for v in (0, 1):
+                if not self._consistent([(n, v)]):
+                    self._assign([(n, 1 - v)])
+                    self.constants[n] = 1 - v
+                    break
+        for n in range(cnl.n_nets):
+            if self.vals[n] != X:
+                self.constants[n] = self.vals[n]
+
+    def stem(self, net, sa):
+        """Whether the fault ``net`` stuck-at ``sa`` is proven untestable."""
+        key = (net, None, sa)
+        if key not in self._memo:
+            if not self.idx.observable(net):
+                self._memo[key] = True
+            else:
+                cone = set(self.idx.cone(net))
+                self._memo[key] = not self._consistent([(net, 1 - sa)] + self._side(net, net, cone))
+        return self._memo[key]
+
+    def branch(self, gate, pin, sa):
+        """Whether input ``pin`` of ``gate`` stuck-at ``sa`` is proven untestable."""
+        key = (gate, pin, sa)
+        if key not in self._memo:
+            out = self.n_pis + gate
+            if not self.idx.observable(out):
+                self._memo[key] = True
+            else:
+                _, ptr, fanin, _, _ = self.lists
+                ins = fanin[ptr[gate]:ptr[gate + 1]]
+                need = [(ins[pin], 1 - sa)]
+                c = self._kinds[gate][0]
+                if c != X:
+                    need += [(u, 1 - c) for k, u in enumerate(ins) if k != pin]
+                cone = set(self.idx.cone(out))
+                self._memo[key] = not self._consistent(need + self._side(out, out, cone))
+        return self._memo[key]
+
+    def po_branch(self, net, sa):
+        """Whether the branch of ``net`` into its PO stuck-at ``sa`` is proven untestable."""
+        return self.constants.get(net) == sa
+
+    def fault(self, name):
+        """Whether the canonical fault ``name`` (see :mod:`fsim.verify`) is proven untestable."""
+        net, reader, pin, sa = parse_fault(self.cnl, name)
+        if reader is None:
+            return self.stem(net, sa)
+        if reader == 'PO':
+            return self.po_branch(net, sa)
+        return self.branch(reader, pin, sa)
+
+    def _side(self, site, net, cone):
+        """Non-controlling side inputs of the post-dominators of ``net``, for a fault at ``site``."""
+        _, ptr, fanin, _, _ = self.lists
+        npi, need = self.n_pis, []
+        d = self.ipdom[net]
+        while d != self.sink:
+            g = d - npi
+            c = self._kinds[g][0]
+            if c != X:
+                need += [(u, 1 - c) for u in fanin[ptr[g]:ptr[g + 1]]
+                         if u != site and (u < npi or u - npi not in cone)]
+            d = self.ipdom[d]
+        return need
+
+    def _consistent(self, assigns):
+        """Whether ``assigns`` (``(net, value)`` pairs) survive implication; values are rolled back."""
+        try:
+            trail = self._assign(assigns)
+        except Conflict as e:
+            trail = e.args[0]
+            ok = False
+        else:
+            ok = True
+        vals = self.vals
+        for n in trail:
+            vals[n] = X
+        return ok
+
+    def _assign(self, assigns):
+        """Set and imply ``assigns``; returns the nets set, raises :class:`Conflict` (with them)."""
+        npi, vals, gins, touch, kinds = self.n_pis, self.vals, self._gins, self._touch, self._kinds
+        trail = []
+        for n, v in assigns:
+            if vals[n] == X:
+                vals[n] = v
+                trail.append(n)
+            elif vals[n] != v:
+                raise Conflict(trail)
+        stack = list(trail)
+        while stack and len(trail) < self.limit:
+            for g in touch[stack.pop()]:
+                ins = gins[g]
+                c, inv = kinds[g]
+                out = npi + g
+                ov = vals[out]
+                iv = [vals[u] for u in ins]
+                if c != X:
+                    nc_out = (1 - c) ^ inv
+                    if c in iv:
+                        put = [(out, nc_out ^ 1)]
+                    elif X not in iv:
+                        put = [(out, nc_out)]
+                    elif ov == nc_out:
+                        put = [(u, 1 - c) for u, v in zip(ins, iv) if v == X]
+                    elif ov != X and iv.count(X) == 1:
+                        put = [(ins[iv.index(X)], c)]
+                    else:
+                        continue
+                else:  # XOR, XNOR, BUF, NOT: parity of the inputs
+                    unknown = iv.count(X)
+                    if not unknown:
+                        put = [(out, (sum(iv) + inv) & 1)]
+                    elif unknown == 1 and ov != X:
+                        put = [(ins[iv.index(X)], (sum(iv) - X + ov + inv) & 1)]
+                    else:
+                        continue
+                for n, v in put:
+                    if vals[n] == X:
+                        vals[n] = v
+                        trail.append(n)
+                        stack.append(n)
+                    elif vals[n] != v:
+                        raise Conflict(trail)
+        return trail
@@ -0,0 +1,96 @@
+"""Zero-copy sharing of large NumPy arrays with pool workers.
+
+The good-machine value matrix (nets x words) of each chunk is computed in
+the parent and copied into one ``multiprocessing.shared_memory`` block that
+lives for the whole run. Workers receive only a small picklable
+:class:`SharedArray` handle and map the same pages, so memory stays flat as
+``--jobs`` grows. The handle goes to a :class:`fsim.parallel.FaultPool` as
+batch data, and its ``prepare`` attaches it once per worker and chunk::
+
+    with SharedBuffer(nbytes, jobs) as buf, FaultPool(jobs, setup, (cnl,), task, prepare) as pool:
+        for good, n in chunks():
+            parts = pool.map(todo, buf.put(good), n)
+
+    def prepare(state, good_ref, n):
+        good = attach(good_ref)   # ndarray view, no copy
+        return (*state, good, valid_mask(n))
+
+``buf.put(good)`` overwrites the previous chunk and returns a fresh handle;
+workers open the block once, whatever the number of chunks. With a single
+job nothing is copied: ``put`` hands back the array itself and ``attach``
+returns it unchanged.
+"""
+
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .parallel import resolve_jobs
+
+# Blocks attached in this process by name; the views must not outlive their mapping.
+_attached = {}
+
+
+class SharedArray:
+    """Picklable handle to an array living in a shared memory block."""
+    def __init__(self, name, shape, dtype):
+        self.name = name
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype).str
+
+    def __repr__(self):
+        return f'SharedArray({self.name!r}, {self.shape}, {self.dtype!r})'
+
+
+def _open(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python >= 3.13
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def attach(ref):
+    """Map ``ref`` into this process; plain arrays are passed through."""
+    if not isinstance(ref, SharedArray):
+        return ref
+    shm = _attached.get(ref.name)
+    if shm is None:
+        shm = _attached[ref.name] = _open(ref.name)
+    arr = np.ndarray(ref.shape, dtype=ref.dtype, buffer=shm.buf)
+    arr.flags.writeable = False
+    return arr
+
+
+class SharedBuffer:
+    """A shared memory block of ``nbytes`` that holds one array after another.
+
+    Only the array of the latest :meth:`put` is valid, so a pool must be done
+    with a batch before the next one is put.
+    """
+    def __init__(self, nbytes, jobs):
+        self.nbytes = nbytes
+        self._shm = None
+        if resolve_jobs(jobs) > 1:
+            self._shm = shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+
+    def put(self, arr):
+        """Copy ``arr`` into the block; returns its handle (``arr`` itself with one job)."""
+        if self._shm is None:
+            return arr
+        arr = np.asarray(arr)
+        if arr.nbytes > self.nbytes:
+            raise ValueError(f'array of {arr.nbytes} bytes does not fit the {self.nbytes} byte buffer')
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=self._shm.buf)[...] = arr
+        return SharedArray(self._shm.name, arr.shape, arr.dtype)
+
+    def close(self):
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
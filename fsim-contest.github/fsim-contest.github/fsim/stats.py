@@ -0,0 +1,166 @@
+"""Run instrumentation: phase timers, hot-path counters and profiling hooks.
+
+The team scripts time their phases with a :class:`Phases` object and call
+:func:`report` once at the end. When ``$FSIM_STATS`` names a file, the summary
+is written there as JSON; otherwise nothing happens and the normal output of
+the script is unchanged::
+
+    phases = Phases()
+    with phases('parse'):
+        ...
+    report(phases, faults=len(all_faults), detected=len(detected), vectors=n_vecs)
+
+The harness expects the phases ``parse`` (netlist and fault list), ``good``
+(fault-free simulation) and ``fault`` (fault simulation); others are kept too.
+
+Hot loops add to the process-wide :data:`counters` once per fault or per
+pass, never per gate, so counting stays cheap:
+
+* ``gates`` -- gate evaluations (good and faulty machines);
+* ``events`` -- faulty net values that differed from the good machine;
+* ``words`` -- 64-bit words simulated (gate evaluations x words per evaluation).
+
+Counts from pool workers are merged by :meth:`fsim.parallel.FaultPool.map`. Every
+vector batch adds a :func:`record_batch` entry with the faults it dropped.
+
+:func:`add_arguments` gives a script ``--profile FILE.prof`` (cProfile around
+the fault simulation, see :func:`profiled`) and ``--sample [HZ]`` (a
+:class:`Sampler`, cheap enough to leave on; ``$FSIM_SAMPLE`` sets the default).
+"""
+
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+STATS_ENV = 'FSIM_STATS'
+SAMPLE_ENV = 'FSIM_SAMPLE'
+
+counters = Counter()
+batches = []
+
+
+class Phases:
+    """Wall time per named phase; re-entering a phase adds to its total."""
+    def __init__(self):
+        self.times = {}
+
+    @contextmanager
+    def __call__(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[name] = self.times.get(name, 0.0) + time.perf_counter() - t0
+
+
+def record_batch(vectors, faults, dropped):
+    """One vector batch simulated ``faults`` faults and dropped ``dropped`` of them."""
+    batches.append({'vectors': vectors, 'faults': faults, 'dropped': dropped})
+
+
+def summary():
+    """Counters and faults dropped per batch as one line of text."""
+    text = ', '.join(f'{k} {v:,}' for k, v in sorted(counters.items())) or 'no counters'
+    if batches:
+        text += '; dropped per batch ' + ' '.join(str(b['dropped']) for b in batches)
+    return text
+
+
+def report(phases, **fields):
+    """Write ``phases``, the counters and ``fields`` to ``$FSIM_STATS``, if set."""
+    path = os.environ.get(STATS_ENV)
+    if not path:
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'phases': phases.times, 'counters': dict(counters), 'batches': batches, **fields}, f)
+
+
+def add_arguments(ap):
+    ap.add_argument('--profile', metavar='FILE.prof',
+                    help='run the fault simulation under cProfile and dump the stats to FILE.prof '
+                         '(main process only; inspect with python -m pstats)')
+    ap.add_argument('--sample', type=float, nargs='?', const=100.0,
+                    default=float(os.environ.get(SAMPLE_ENV) or 0), metavar='HZ',
+                    help='sample the stack HZ times per second (default 100) and print the hottest functions')
+
+
+@contextmanager
+def profiled(path):
+    """Run the block under cProfile and dump the stats to ``path``; no-op if ``path`` is empty."""
+    if not path:
+        yield
+        return
+    prof = cProfile.Profile()
+    prof.enable()
+    try:
+        yield
+    finally:
+        prof.disable()
+        prof.dump_stats(path)
+
+
+class Sampler:
+    """Statistical profiler: a daemon thread records the main thread's stack ``hz`` times a second.
+
+    The cost is one stack walk per sample and nothing in between. Samples
+    only land between bytecodes, so time inside one long NumPy call is
+    charged to the Python line that made it.
+    """
+    def __init__(self, hz=100.0):
+        self.interval = 1.0 / hz
+        self.samples = 0
+        self.own = Counter()    # function -> samples where it was running
+        self.total = Counter()  # function -> samples where it was on the stack
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        ident = threading.main_thread().ident
+        self._thread = threading.Thread(target=self._run, args=(ident,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self, ident):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(ident)
+            if frame is None:
+                continue
+            self.samples += 1
+            self.own[_where(frame)] += 1
+            seen = set()
+            while frame is not None:
+                seen.add(_where(frame))
+                frame = frame.f_back
+            self.total.update(seen)
+
+    def top(self, n=15):
+        """``[(function, own %, total %)]`` of the ``n`` functions with most own samples."""
+        if not self.samples:
+            return []
+        return [(f, 100.0 * c / self.samples, 100.0 * self.total[f] / self.samples)
+                for f, c in self.own.most_common(n)]
+
+    def format(self, n=15):
+        lines = [f'{self.samples} samples, own% total% function']
+        lines += [f'{own:6.1f} {tot:6.1f}  {f}' for f, own, tot in self.top(n)]
+        return '\n'.join(lines)
+
+
+def _where(frame):
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+def start_sampler(hz):
+    """A running :class:`Sampler`, or None when ``hz`` is 0."""
+    return Sampler(hz).start() if hz else None
@@ -0,0 +1,98 @@
+"""Verbosity levels for log messages and bulk trace files for per-record output.
+
+Log messages carry a level: :data:`QUIET` (results only, ``-q``),
+:data:`NORMAL` (progress, the default) or :data:`DEBUG` (``-v``). A
+:class:`Reporter` takes printf-style arguments and only formats messages
+whose level is shown, so a debug line in a loop costs one comparison::
+
+    say = Reporter(log.info, args.verbose)
+    say(DEBUG, 'PO indices %s', po_c_indices)   # formatted only with -v
+
+Per-vector and per-fault records (the fault-free I/O table, the fault list
+and the first vector that detected each fault, -1 if none) never go through
+the log. With
+``--trace PREFIX`` they are handed to a :class:`Trace` as whole arrays and
+written in bulk: the I/O table once per chunk to ``PREFIX.io.csv``, the
+faults once at the end to ``PREFIX.faults.csv``. ``--trace-format npy``
+writes the same tables as ``.npy`` files instead (the I/O table as an
+``(n_vecs, n_pis + n_pos)`` uint8 array, the faults as a structured array).
+"""
+
+import numpy as np
+
+QUIET, NORMAL, DEBUG = 0, 1, 2
+
+FAULT_DTYPE = np.dtype([('fault', '<i8'), ('line', '<i8'), ('sa', 'u1'),
+                        ('detected', '?'), ('vector', '<i8')])
+
+
+def add_arguments(ap):
+    ap.add_argument('-v', '--verbose', action='count', default=NORMAL,
+                    help='also log debug details (shapes, PO indices, per-chunk counts)')
+    ap.add_argument('-q', '--quiet', dest='verbose', action='store_const', const=QUIET,
+                    help='log the results only')
+    ap.add_argument('--trace', metavar='PREFIX',
+                    help='write the fault-free I/O table to PREFIX.io.* and the per-fault results '
+                         'to PREFIX.faults.*')
+    ap.add_argument('--trace-format', choices=('csv', 'npy'), default='csv',
+                    help='format of the --trace files (default csv)')
+
+
+class Reporter:
+    """Calls ``sink(message)`` for messages at or below ``level``."""
+    def __init__(self, sink, level=NORMAL):
+        self.sink = sink
+        self.level = level
+
+    def __call__(self, level, fmt, *args):
+        if level <= self.level:
+            self.sink(fmt % args if args else fmt)
+
+    def enabled(self, level):
+        return level <= self.level
+
+
+class Trace:
+    """Bulk writer for the ``--trace`` tables; see the module docstring."""
+    def __init__(self, prefix, fmt, n_vecs, columns):
+        self.prefix = prefix
+        self.fmt = fmt
+        self.columns = list(columns)
+        if fmt == 'npy':
+            self._io = np.lib.format.open_memmap(f'{prefix}.io.npy', mode='w+', dtype=np.uint8,
+                                                 shape=(n_vecs, len(self.columns)))
+        else:
+            self._io = open(f'{prefix}.io.csv', 'w', encoding='utf-8', newline='\n')
+            self._io.write(','.join(['vec'] + self.columns) + '\n')
+
+    def vectors(self, t0, planes, n):
+        """Vectors ``t0 .. t0 + n - 1``; ``planes`` is (columns, words) uint64, one row per column."""
+        bits = np.unpackbits(np.ascontiguousarray(planes).view(np.uint8), axis=1,
+                             bitorder='little')[:, :n].T
+        if self.fmt == 'npy':
+            self._io[t0:t0 + n] = bits
+        else:
+            table = np.column_stack((np.arange(t0, t0 + n), bits))
+            np.savetxt(self._io, table, fmt='%d', delimiter=',')
+
+    def faults(self, records):
+        """All faults at once, as a :data:`FAULT_DTYPE` array."""
+        if self.fmt == 'npy':
+            np.save(f'{self.prefix}.faults.npy', records)
+            return
+        with open(f'{self.prefix}.faults.csv', 'w', encoding='utf-8', newline='\n') as f:
+            f.write(','.join(FAULT_DTYPE.names) + '\n')
+            np.savetxt(f, np.column_stack([records[k].astype(np.int64) for k in FAULT_DTYPE.names]),
+                       fmt='%d', delimiter=',')
+
+    def close(self):
+        if self.fmt == 'npy':
+            self._io.flush()
+            del self._io
+        else:
+            self._io.close()
+
+
+def open_trace(prefix, fmt, n_vecs, columns):
+    """A :class:`Trace`, or None when ``prefix`` is empty."""
+    return Trace(prefix, fmt, n_vecs, columns) if prefix else None
@@ -0,0 +1,174 @@
+"""Cross-engine differential check on a canonical stuck-at fault universe.
+
+The team scripts count faults differently (kyupy lines, stem + pin lines, nets
+only), so their totals cannot be compared directly. Each script therefore maps
+its own fault sites onto canonical names and, when ``$FSIM_FAULTS`` names a
+file, writes the faults it models and the ones it detected there
+(:func:`report_faults`). A site is named by net and reader pin:
+
+* ``net`` -- the stem, i.e. the net itself; for a net with a single reader
+  the stem and its only branch are the same fault and share this name;
+* ``net>gate:pin`` -- the branch of a net with several readers into input
+  ``pin`` of the gate driving net ``gate``;
+* ``net>PO`` -- the branch of such a net into its primary output.
+
+The fault name appends ``/SA0`` or ``/SA1``. A canonical fault counts as
+detected when any of the engine's faults mapped onto it was detected.
+
+:func:`diff` compares two engines on the faults both model, and
+:class:`Reference` re-simulates a disputed fault serially on the compiled
+netlist to tell which side is right and to find the first test vector that
+detects it. ``python -m fsim.benchmark --verify`` runs the check on every
+circuit before accepting the timings.
+"""
+
+import json
+import os
+
+from .netlist import AND, BUF, NAND, NOR, NOT, OR, XNOR, XOR
+from .patterns import iter_patterns
+
+FAULTS_ENV = 'FSIM_FAULTS'
+
+
+def site_name(net, reader=None, pin=None):
+    """Canonical site: the stem ``net``, or its branch into ``reader`` (``'PO'`` or a gate)."""
+    if reader is None:
+        return str(net)
+    if reader == 'PO':
+        return f'{net}>PO'
+    return f'{net}>{reader}:{pin}'
+
+
+def fault_name(site, sa):
+    return f'{site}/SA{sa}'
+
+
+def report_faults(universe, detected):
+    """Write the canonical ``universe`` and ``detected`` fault names to ``$FSIM_FAULTS``, if set."""
+    path = os.environ.get(FAULTS_ENV)
+    if not path:
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'universe': sorted(set(universe)), 'detected': sorted(set(detected))}, f)
+
+
+def load_faults(path):
+    """``(universe, detected)`` as sets, as written by :func:`report_faults`."""
+    with open(path, encoding='utf-8') as f:
+        d = json.load(f)
+    return set(d['universe']), set(d['detected'])
+
+
+def parse_fault(cnl, name):
+    """``(net, reader, pin, sa)`` of a canonical fault name on ``cnl``; reader is a gate id, ``'PO'`` or None."""
+    site, _, sa = name.rpartition('/SA')
+    net, _, branch = site.partition('>')
+    if not branch:
+        return cnl.net_id(net), None, None, int(sa)
+    if branch == 'PO':
+        return cnl.net_id(net), 'PO', None, int(sa)
+    reader, _, pin = branch.rpartition(':')
+    return cnl.net_id(net), cnl.net_id(reader) - cnl.n_pis, int(pin), int(sa)
+
+
+def diff(a, b):
+    """Faults modelled by both ``a`` and ``b`` (``(universe, detected)`` pairs) on which they disagree.
+
+    Returns ``(only_a, only_b, common)``: sorted fault names detected only by
+    ``a`` and only by ``b``, and the number of faults compared.
+    """
+    common = a[0] & b[0]
+    da, db = a[1] & common, b[1] & common
+    return sorted(da - db), sorted(db - da), len(common)
+
+
+class Reference:
+    """Plain serial fault simulator over all test vectors at once.
+
+    Every net holds one Python integer with bit ``t`` set when the net is 1
+    under vector ``t``; a fault is simulated by re-evaluating its fanout cone.
+    Slow, but independent of all engines, so it is only used to arbitrate.
+    """
+    def __init__(self, cnl, tests, bench=None):
+        self.cnl = cnl
+        self.op, self.ptr, self.fanin, self.fptr, self.fanout = cnl.as_lists()
+        self.pi_rows = [0] * cnl.n_pis
+        self.n = 0
+        for planes, n in iter_patterns(tests, cnl.n_pis, bench=bench):
+            for i, row in enumerate(planes):
+                self.pi_rows[i] |= int.from_bytes(row.tobytes(), 'little') << self.n
+            self.n += n
+        self.mask = (1 << self.n) - 1
+        self.good = self.simulate(list(self.pi_rows) + [0] * cnl.n_gates)
+
+    def _eval(self, g, vals, pin=None, forced=None):
+        ins = [vals[u] for u in self.fanin[self.ptr[g]:self.ptr[g + 1]]]
+        if pin is not None:
+            ins[pin] = forced
+        op, v = self.op[g], ins[0]
+        if op in (AND, NAND):
+            for x in ins[1:]:
+                v &= x
+        elif op in (OR, NOR):
+            for x in ins[1:]:
+                v |= x
+        elif op in (XOR, XNOR):
+            for x in ins[1:]:
+                v ^= x
+        elif op not in (BUF, NOT):
+            raise ValueError(f'Unsupported opcode {op}')
+        return v ^ self.mask if op in (NOT, NAND, NOR, XNOR) else v
+
+    def simulate(self, vals):
+        n_pis = self.cnl.n_pis
+        for g in range(self.cnl.n_gates):
+            vals[n_pis + g] = self._eval(g, vals)
+        return vals
+
+    def parse(self, name):
+        return parse_fault(self.cnl, name)
+
+    def detecting(self, name):
+        """Bit mask of the vectors that detect fault ``name``."""
+        net, reader, pin, sa = self.parse(name)
+        forced = self.mask if sa else 0
+        n_pis, good = self.cnl.n_pis, self.good
+        if reader == 'PO':
+            return forced ^ good[net]
+        vals = list(good)
+        if reader is None:
+            vals[net] = forced
+            start = net
+        else:
+            start = n_pis + reader
+            vals[start] = self._eval(reader, vals, pin, forced)
+        # gates are numbered in levelized order, so one forward sweep over the cone suffices
+        dirty = {start} if vals[start] != good[start] else set()
+        for g in range(max(start - n_pis + 1, 0), self.cnl.n_gates):
+            ins = self.fanin[self.ptr[g]:self.ptr[g + 1]]
+            if any(u in dirty for u in ins):
+                v = self._eval(g, vals)
+                if v != good[n_pis + g]:
+                    vals[n_pis + g] = v
+                    dirty.add(n_pis + g)
+        return self._observe(vals, dirty)
+
+    def _observe(self, vals, dirty):
+        diff_bits = 0
+        for p in self.cnl.pos.tolist():
+            if p in dirty:
+                diff_bits |= vals[p] ^ self.good[p]
+        return diff_bits
+
+    def vector(self, t):
+        """PI values of vector ``t`` as a ``0``/``1`` string."""
+        return ''.join('1' if row >> t & 1 else '0' for row in self.pi_rows)
+
+    def explain(self, name):
+        """``(detected, t, vector)`` per the reference; ``t`` is the first detecting vector or None."""
+        bits = self.detecting(name)
+        if not bits:
+            return False, None, None
+        t = (bits & -bits).bit_length() - 1
+        return True, t, self.vector(t)
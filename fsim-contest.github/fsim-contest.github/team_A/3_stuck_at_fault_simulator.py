@@ -9,12 +9,36 @@ Stuck-at Fault Simulator (supports c.ndim=3)
 
 import argparse
 import re
+import sys
+from pathlib import Path
 import numpy as np
-from kyupy import bench, log, logic
+from kyupy import bench, log
+from kyupy.circuit import GrowingList, Line, Node
 from kyupy.logic_sim import LogicSim
 
-
-# ---------- Read I/O names from .bench (for printing) ----------
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from fsim.cache import cached_golden, cached_pickle, load_netlist
+from fsim.collapse import collapse_faults
+from fsim.coverage import Coverage, write_curve
+from fsim.coverage import add_arguments as add_coverage_arguments
+from fsim.parallel import FaultPool
+from fsim.patterns import CHUNK, WORD_BITS, chunk_size, count_patterns, iter_patterns, valid_mask
+from fsim.randgen import Useful, check_arguments, iter_random
+from fsim.randgen import add_arguments as add_random_arguments
+from fsim.redundancy import Redundancy
+from fsim.shm import SharedBuffer, attach
+from fsim.stats import Phases, add_arguments, counters, profiled, record_batch, report, start_sampler, summary
+from fsim.trace import DEBUG, FAULT_DTYPE, NORMAL, QUIET, Reporter, open_trace
+from fsim.trace import add_arguments as add_trace_arguments
+from fsim.verify import fault_name, report_faults, site_name
+
+
+SLOT_BUDGET = 32 << 20  # bytes of lsim.c per worker when --slots is 0
+MAX_CELL_INS = 4  # kyupy's SimOps reads inputs 0..3 of a cell and ignores the rest
+LOW_BIT = np.array([(b & -b).bit_length() - 1 for b in range(256)], dtype=np.int64)  # byte -> lowest set bit
+
+
+# ---------- Read I/O names from .bench (for the --trace header) ----------
 def parse_bench_io_names(bench_path: str):
     text = open(bench_path, 'r', encoding='utf-8', errors='ignore').read()
     def grab(pattern):
@@ -25,17 +49,87 @@ def parse_bench_io_names(bench_path: str):
     return grab(r'\.inputs\s*\(([^)]*)\)'), grab(r'\.outputs\s*\(([^)]*)\)')
 
 
-# ---------- mv ↔ char ----------
-def mv_val_to_char(v):
-    vv = int(v) & 0b11  # 00->0, 11->1, 01/10->X
-    return '0' if vv == 0 else ('1' if vv == 3 else 'X')
-
-def mv_row_to_str(mv_row_1d):
-    return ''.join(mv_val_to_char(x) for x in mv_row_1d)
+# ---------- Fault collapsing structure ----------
+def collapse_structure(circuit):
+    """kyupy nodes as fsim.collapse gates/links; a one-in/one-out fork links its two lines."""
+    gates, links = [], []
+    for n in circuit.nodes:
+        ins = [l.index for l in n.ins if l is not None]
+        outs = [l.index for l in n.outs if l is not None]
+        if n.kind == '__fork__':
+            if len(ins) == 1 and len(outs) == 1:
+                links.append((ins[0], outs[0]))
+        elif outs:
+            gates.append((n.kind, ins, outs[0]))
+    return gates, links
+
+
+def canonical_sites(circuit):
+    """fsim.verify site name per line: cell -> fork is a stem, fork -> cell a branch."""
+    sites = []
+    for line in circuit.lines:
+        fork, reader = line.driver, line.reader
+        if reader.kind == '__fork__':
+            sites.append(site_name(reader.name))
+            continue
+        readers = sum(l is not None for l in fork.outs) + (fork in circuit.io_nodes and len(fork.ins) > 0)
+        sites.append(site_name(fork.name, reader.name, line.reader_pin) if readers > 1 else site_name(fork.name))
+    return sites
+
+
+# ---------- Cells wider than kyupy simulates ----------
+TREE_KINDS = (('nand', 'AND'), ('and', 'AND'), ('nor', 'OR'), ('or', 'OR'), ('xnor', 'XOR'), ('xor', 'XOR'))
+
+
+def split_wide_cells(circuit):
+    """Rebuild every cell with more than MAX_CELL_INS inputs as a tree, in place.
+
+    kyupy silently drops the inputs beyond the fourth (c432 has 9-input NANDs).
+    The cell keeps its name, kind and output line; its input lines are moved
+    to new non-inverting cells ``name~k`` of at most MAX_CELL_INS inputs whose
+    outputs feed it. Existing lines keep their indices (fault sites and the
+    collapsing structure are taken before the split); the new lines are
+    appended after them and carry no faults. Returns the number of cells split.
+    """
+    split = 0
+    for cell in list(circuit.cells.values()):
+        sources = [l for l in cell.ins if l is not None]
+        if len(sources) <= MAX_CELL_INS:
+            continue
+        kind = next((k for prefix, k in TREE_KINDS if cell.kind.lower().startswith(prefix)), None)
+        if kind is None:
+            raise ValueError(f'cell {cell.name} ({cell.kind}) has {len(sources)} inputs, '
+                             f'kyupy simulates at most {MAX_CELL_INS}')
+
+        def feed(reader, group):
+            for pin, src in enumerate(group):
+                if isinstance(src, Node):
+                    Line(circuit, (src, 0), (reader, pin))
+                else:
+                    src.reader, src.reader_pin = reader, pin
+                    reader.ins[pin] = src
+
+        cell.ins = GrowingList()
+        k = 0
+        while len(sources) > MAX_CELL_INS:
+            grouped = []
+            for i in range(0, len(sources), MAX_CELL_INS):
+                group = sources[i:i + MAX_CELL_INS]
+                if len(group) == 1:
+                    grouped.append(group[0])
+                    continue
+                sub = Node(circuit, f'{cell.name}~{k}', kind)
+                k += 1
+                feed(sub, group)
+                grouped.append(sub)
+            sources = grouped
+        feed(cell, sources)
+        split += 1
+    return split
 
 
 # ---------- Infer "which c-lines correspond to POs" ----------
-def guess_po_c_indices(lsim, circuit, num_po):
+def guess_po_c_indices(lsim, circuit, num_po, say):
     # 1) Try to use attributes from lsim (if available)
     for attr in ('po_c_locs', 'po_locs', 'po_lines', 'po_idxs'):
         if hasattr(lsim, attr):
@@ -43,7 +137,7 @@ def guess_po_c_indices(lsim, circuit, num_po):
             try:
                 arr = np.asarray(idx, dtype=int)
                 if arr.size == num_po:
-                    log.info(f'[dbg] PO indices from lsim.{attr} = {arr.tolist()}')
+                    say(DEBUG, '[dbg] PO indices from lsim.%s = %s', attr, arr)
                     return arr
             except Exception:
                 pass
@@ -67,7 +161,7 @@ def guess_po_c_indices(lsim, circuit, num_po):
                             break
             if len(cand) == num_po:
                 arr = np.array(cand, dtype=int)
-                log.info(f'[dbg] PO indices from circuit.pos = {arr.tolist()}')
+                say(DEBUG, '[dbg] PO indices from circuit.pos = %s', arr)
                 return arr
     except Exception:
         pass
@@ -76,7 +170,7 @@ def guess_po_c_indices(lsim, circuit, num_po):
     total_lines = len(getattr(circuit, 'lines', []))
     if total_lines >= num_po:
         arr = np.arange(total_lines - num_po, total_lines, dtype=int)
-        log.info(f'[warn] fallback PO indices (last {num_po} lines): {arr.tolist()}')
+        log.warn(f'fallback PO indices (last {num_po} lines): {arr.tolist()}')
         return arr
 
     raise RuntimeError('Could not infer PO indices in c, and circuit.lines is too short for fallback.')
@@ -115,44 +209,32 @@ def extract_po_bp2_from_c(lsim, po_c_indices):
         raise RuntimeError(f'Unsupported lsim.c shape: {c.shape}')
 
 
-def main():
-    ap = argparse.ArgumentParser(description='Stuck-at fault simulator (reads PO from c, supports c.ndim=3).')
-    ap.add_argument('bench', help='BENCH netlist file (e.g., c17.bench)')
-    ap.add_argument('tests', help='Test vectors: one line per PI, each a bitstring of length=#vectors')
-    args = ap.parse_args()
+# ---------- fsim.patterns bit-planes ↔ kyupy bp ----------
+def planes_to_bp(planes, n):
+    """(num_pi, words) uint64 planes as bp (num_pi, 3, bytes); both data planes carry the 0/1 value."""
+    data = planes.view(np.uint8)[:, :(n + 7) // 8]
+    bp = np.zeros((len(planes), 3, data.shape[1]), dtype=np.uint8)
+    bp[:, 0] = data
+    bp[:, 1] = data
+    return bp
 
-    # Load circuit and test data
-    circuit = bench.load(args.bench)
-    log.info(f'Circuit {circuit}')
-    with open(args.tests, 'r', encoding='utf-8', errors='ignore') as f:
-        tests = logic.mvarray(*f.read().splitlines())
-    log.info(f'TestDataShape {tests.shape}')
 
-    # I/O names (for printing)
-    pi_names, po_names = parse_bench_io_names(args.bench)
+def bp_to_planes(data, n):
+    """One bp data plane (rows, bytes) back to (rows, words) uint64 planes, padding bits cleared."""
+    n_words = (n + WORD_BITS - 1) // WORD_BITS
+    buf = np.zeros((len(data), n_words * 8), dtype=np.uint8)
+    buf[:, :(n + 7) // 8] = data[:, :(n + 7) // 8]
+    return buf.view('<u8') & valid_mask(n)
 
-    sims = tests.shape[1]
-    lsim = LogicSim(circuit, sims=sims, m=2)
-    num_pi = len(lsim.pi_s_locs)
-    num_po = len(lsim.po_s_locs)
 
-    if len(pi_names) < num_pi:
-        pi_names += [f'PI{i}' for i in range(len(pi_names), num_pi)]
-    if len(po_names) < num_po:
-        po_names += [f'PO{i}' for i in range(len(po_names), num_po)]
-    pi_names = pi_names[:num_pi]
-    po_names = po_names[:num_po]
-    log.info(f'#PI={num_pi} #PO={num_po} sims={sims} m=2')
+def count_c_prop(lsim, n=1):
+    """Add n c_prop passes of lsim to the fsim.stats counters (every op over every byte of c)."""
+    counters['gates'] += n * len(lsim.ops)
+    counters['words'] += n * len(lsim.ops) * ((lsim.c.shape[-1] + 7) // 8)
 
-    # PI rows → bp
-    input_mv = tests[:num_pi]
-    input_bp = logic.mv_to_bp(input_mv)  # (num_pi, 2, W)
 
-    # Try to get PO indices in c
-    po_c_indices = guess_po_c_indices(lsim, circuit, num_po)
-
-    # ===== Golden =====
-    log.info('--- Running Golden (Fault-Free) Simulation ---')
+# ---------- Golden (fault-free) run ----------
+def golden_po_bp2(lsim, input_bp, po_c_indices):
     try:
         lsim.s[...] = 0
         # Your environment: c is 3D, no slot; just zero it out
@@ -164,82 +246,283 @@ def main():
     lsim.s[0, lsim.pi_s_locs, :2] = input_bp[:, :2]
     lsim.s_to_c()
     lsim.c_prop()
-
-    log.info(f'[dbg] lsim.s.shape={getattr(lsim.s,"shape",None)} lsim.c.shape={getattr(lsim.c,"shape",None)}')
+    count_c_prop(lsim)
 
     # Extract PO planes from c
-    golden_c_bp2 = extract_po_bp2_from_c(lsim, po_c_indices)  # (num_po, 2, W)
-    log.info(f'[dbg] golden_c_bp2.shape={golden_c_bp2.shape}')
-
-    # Convert to mv and print I/O table
-    golden_mv_rows = [logic.bp_to_mv(golden_c_bp2[i]) for i in range(num_po)]
-    golden_mv = np.vstack(golden_mv_rows)  # (num_po, sims)
-    golden_bin = np.array([logic.mv_final(golden_mv[i]) for i in range(num_po)], dtype=np.uint8)
-    ones_count = golden_bin.sum(axis=1).tolist()
-    log.info(f'[dbg] PO ones_count (first {min(10,num_po)}): {ones_count[:min(10,num_po)]}')
-
-    log.info('--- Fault-Free I/O per Test Vector ---')
-    header = ['vec'] + pi_names + ['->'] + po_names
-    log.info('  ' + ' | '.join(header))
-    pi_mv_strings = [mv_row_to_str(input_mv[i]) for i in range(num_pi)]
-    po_mv_strings = [mv_row_to_str(golden_mv[i]) for i in range(num_po)]
-    for t in range(sims):
-        row = [f'{t:04d}'] + [s[t] for s in pi_mv_strings] + ['->'] + [s[t] for s in po_mv_strings]
-        log.info('  ' + ' | '.join(row))
-    log.info('--- End of I/O dump ---')
-
-    # ===== Fault Simulation (compare directly in c) =====
-    all_faults = [(line.index, sa) for line in circuit.lines for sa in (0, 1)]
-    total_faults = len(all_faults)
-    detected_faults = set()
-
-    log.info(f'\n--- Full Fault List ({total_faults} faults) ---')
-    for i, (loc, sa) in enumerate(all_faults):
-        log.info(f'  {i}: Line {loc} stuck-at {sa}')
-    log.info('--- End of Fault List ---\n')
-
-    log.info('--- Running Full Fault Simulation with Individual Fault Checks ---')
-    for fault_location, stuck_at_value in all_faults:
-        try:
-            lsim.s[1, :, :] = 0
-            lsim.c[...] = 0
-        except Exception:
-            pass
-
-        lsim.s[1, lsim.pi_s_locs, :2] = input_bp[:, :2]
-        lsim.s_to_c()
-        lsim.c_prop(fault_line=fault_location, fault_model=stuck_at_value)
-
-        golden_bp2 = extract_po_bp2_from_c(lsim, po_c_indices)
-        faulty_bp2 = extract_po_bp2_from_c(lsim, po_c_indices)
-
-        # Note: When c has no slot dimension, c_prop overwrites the same c buffer,
-        # so we must run golden and faulty separately to compare.
-        # Here we explicitly run golden first (no fault), then faulty.
-        lsim.c[...] = 0
-        lsim.s[1, lsim.pi_s_locs, :2] = input_bp[:, :2]
-        lsim.s_to_c()
-        lsim.c_prop()  # no fault
-        golden_bp2 = extract_po_bp2_from_c(lsim, po_c_indices)
+    return extract_po_bp2_from_c(lsim, po_c_indices)  # (num_po, 2, W)
+
+
+# ---------- Per-worker fault simulation (see fsim.parallel) ----------
+# Faults are packed across the sims dimension: the chunk's vectors are repeated
+# in `slots` byte-aligned blocks and block k carries the k-th fault of a group
+# (injected by inject_cb), so one c_prop simulates `slots` faulty machines.
+# The golden PO response is tiled once and compared in preallocated buffers;
+# bit b of byte k in a block is vector 8k + b of the chunk.
+# One pool serves the whole run: the circuit reaches every worker once, each
+# chunk only a handle to its PI and golden PO planes in shared memory; the
+# LogicSim is rebuilt only when the chunk needs a different number of sims.
+def _fault_sim_setup(circuit, po_c_indices):
+    return {'circuit': circuit, 'po_c_indices': po_c_indices, 'lsim': None}
+
+
+def _fault_sim_prepare(state, io_ref, n, slots):
+    io = attach(io_ref)  # (num_pi + num_po, words): PI planes, then golden PO planes
+    po_c_indices = state['po_c_indices']
+    nbytes = (n + 7) // 8
+    lsim = state['lsim']
+    if lsim is None or lsim.sims != slots * nbytes * 8:
+        lsim = state['lsim'] = None  # free the old c before allocating the new one
+        lsim = state['lsim'] = LogicSim(state['circuit'], sims=slots * nbytes * 8, m=2)
+    num_pi = len(lsim.pi_s_locs)
+    input_bp = planes_to_bp(io[:num_pi], n)
+    golden_po = np.ascontiguousarray(io[num_pi:]).view(np.uint8)
+    lsim.s[0, lsim.pi_s_locs, :2] = np.tile(input_bp[:, :2, :nbytes], slots)
+    lsim.s_to_c()
+    golden = np.tile(golden_po[:, np.newaxis, :nbytes], slots)  # (num_po, 1, slots * nbytes)
+    care = np.tile(valid_mask(n).view(np.uint8)[:nbytes], slots)
+    po_buf = np.empty_like(golden)
+    return lsim, po_c_indices, golden, care, po_buf, nbytes, slots
+
+
+def _fault_sim_task(state, faults):
+    """Returns the first detecting vector of the chunk per fault (-1 if undetected), in order."""
+    lsim, po_c_indices, golden, care, po_buf, nbytes, slots = state
+    first = []
+    for g0 in range(0, len(faults), slots):
+        group = faults[g0:g0 + slots]
+        blocks = {}  # line -> (sa0 blocks, sa1 blocks)
+        for k, (fault_location, stuck_at_value) in enumerate(group):
+            blocks.setdefault(fault_location, ([], []))[stuck_at_value].append(k)
+
+        def inject_cb(line, v):
+            b = blocks.get(line)
+            if b is not None:
+                v = v.reshape(slots, nbytes)
+                v[b[0]] = 0
+                v[b[1]] = 255
+
+        lsim.c_prop(inject_cb=inject_cb)
+        np.take(lsim.c, po_c_indices, axis=0, out=po_buf)
+        po_buf ^= golden
+        po_buf &= care
+        diff = np.bitwise_or.reduce(po_buf.reshape(len(po_buf), slots, nbytes), axis=0)[:len(group)]
+        k = (diff != 0).argmax(axis=1)  # first byte with a difference
+        byte = diff[np.arange(len(group)), k]
+        first.extend(np.where(byte != 0, 8 * k + LOW_BIT[byte], -1).tolist())
+    count_c_prop(lsim, (len(faults) + slots - 1) // slots)
+    return first
 
-        lsim.c[...] = 0
-        lsim.s[1, lsim.pi_s_locs, :2] = input_bp[:, :2]
-        lsim.s_to_c()
-        lsim.c_prop(fault_line=fault_location, fault_model=stuck_at_value)
-        faulty_bp2 = extract_po_bp2_from_c(lsim, po_c_indices)
-
-        if np.any(golden_bp2 != faulty_bp2):
-            detected_faults.add((fault_location, stuck_at_value))
-            log.info(f'  [DETECTED] Fault on Line {fault_location} stuck-at {stuck_at_value}')
-        else:
-            log.info(f'  [NOT DETECTED] Fault on Line {fault_location} stuck-at {stuck_at_value}')
 
-    detected_count = len(detected_faults)
+def main():
+    ap = argparse.ArgumentParser(description='Stuck-at fault simulator (reads PO from c, supports c.ndim=3).')
+    ap.add_argument('bench', help='BENCH netlist file (e.g., c17.bench)')
+    ap.add_argument('tests', nargs='?',
+                    help='Test vectors: .tests text (one line per vector, PI values first) or packed .tpk '
+                         '(or use --random)')
+    ap.add_argument('--no-cache', action='store_true', help='Always re-parse the bench file')
+    ap.add_argument('--jobs', type=int, default=1, help='Worker processes for the fault list (0 = all cores)')
+    ap.add_argument('--chunk', type=int, default=CHUNK, help='Test vectors read and simulated per chunk')
+    ap.add_argument('--slots', type=int, default=0,
+                    help='Faulty machines packed into one c_prop (0 = as many as fit in ~32 MB of c)')
+    ap.add_argument('--collapse', choices=('none', 'equiv', 'dominance'), default='equiv',
+                    help='Simulate only representative faults (equivalence, optionally + dominance)')
+    ap.add_argument('--untestable', action='store_true',
+                    help='Prove faults untestable before simulation (fsim.redundancy), '
+                         'never simulate them and also report the testable coverage')
+    add_arguments(ap)
+    add_trace_arguments(ap)
+    add_coverage_arguments(ap)
+    add_random_arguments(ap)
+    args = ap.parse_args()
+    check_arguments(ap, args)
+    say = Reporter(log.info, args.verbose)
+    sampler = start_sampler(args.sample)
+
+    # Load circuit (parsed circuit + I/O names cached by bench content hash)
+    phases = Phases()
+    with phases('parse'):
+        circuit, pi_names, po_names = cached_pickle(
+            args.bench, 'kyupy', lambda: (bench.load(args.bench), *parse_bench_io_names(args.bench)),
+            use_cache=not args.no_cache)
+        # fault sites and collapsing structure of the netlist as written; the
+        # lines split_wide_cells adds come after these and are not fault sites
+        n_lines = len(circuit.lines)
+        sites = canonical_sites(circuit)
+        structure = collapse_structure(circuit)
+        n_split = split_wide_cells(circuit)
+    say(NORMAL, 'Circuit %s', circuit)
+    if n_split:
+        say(NORMAL, 'Split %d cells with more than %d inputs into trees', n_split, MAX_CELL_INS)
+
+    # PI/PO positions among the I/O nodes (a .tests line has one column per I/O node);
+    # c locations do not depend on sims, so one small LogicSim serves all chunks.
+    lsim = LogicSim(circuit, sims=8, m=2)
+    pi_s_locs = lsim.pi_s_locs
+    num_pi = len(pi_s_locs)
+    num_po = len(lsim.po_s_locs)
+    po_c_indices = guess_po_c_indices(lsim, circuit, num_po, say)
+
+    if len(pi_names) < num_pi:
+        pi_names += [f'PI{i}' for i in range(len(pi_names), num_pi)]
+    if len(po_names) < num_po:
+        po_names += [f'PO{i}' for i in range(len(po_names), num_po)]
+    pi_names = pi_names[:num_pi]
+    po_names = po_names[:num_po]
+    say(NORMAL, '#PI=%d #PO=%d chunk=%d m=2', num_pi, num_po, args.chunk)
+
+    all_faults = [(loc, sa) for loc in range(n_lines) for sa in (0, 1)]
+    total_faults = len(all_faults)
+    if args.collapse == 'none':
+        sim_faults = all_faults
+    else:
+        with phases('parse'):
+            gates, links = structure
+            cf = collapse_faults(all_faults, gates, links, dominance=args.collapse == 'dominance')
+        sim_faults = cf.reps
+        say(NORMAL, 'Collapsed (%s) fault list: %d of %d faults', args.collapse, len(sim_faults), total_faults)
+
+    # --untestable: the analysis runs on the compiled netlist, so lines are matched
+    # through their canonical fault names; a fault is untestable with its equivalence
+    # class representative. The proven representatives are never simulated.
+    untestable = set()
+    if args.untestable:
+        with phases('static'):
+            red = Redundancy(load_netlist(args.bench, use_cache=not args.no_cache)[0])
+            rep_of = cf.rep_of if args.collapse != 'none' else {}
+            proven = {}
+            for f in all_faults:
+                r = rep_of.get(f, f)
+                if r not in proven:
+                    proven[r] = red.fault(fault_name(sites[r[0]], r[1]))
+                if proven[r]:
+                    untestable.add(f)
+            sim_faults = [f for f in sim_faults if not proven[f]]
+        say(NORMAL, 'Untestable faults (static): %d', len(untestable))
+    detected_at = {}  # fault -> first vector that detected it
+
+    # ===== Golden =====
+    # PO responses for all tests, memory-mapped from the golden cache
+    # (fsim.cache, keyed by bench + tests hash) or simulated chunk by chunk.
+    # With --random the vectors are generated in process (fsim.randgen) and
+    # their PO responses simulated chunk by chunk as they are drawn.
+    n_vecs = args.random or count_patterns(args.tests)
+    trace = open_trace(args.trace, args.trace_format, n_vecs, pi_names + po_names)
+
+    def pi_chunks():
+        n_cols = int(pi_s_locs.max()) + 1 if num_pi else 0
+        for planes, n in iter_patterns(args.tests, n_cols, args.chunk, args.bench):
+            yield planes[pi_s_locs], n
+
+    def golden_chunk(planes, n):
+        golden_c_bp2 = golden_po_bp2(LogicSim(circuit, sims=n, m=2), planes_to_bp(planes, n), po_c_indices)
+        return bp_to_planes(golden_c_bp2[:, 0], n)
+
+    say(NORMAL, '--- Running Golden (Fault-Free) Simulation ---')
+    if args.random:
+        say(NORMAL, 'Random tests: up to %d vectors, seed %d', n_vecs, args.seed)
+
+        def chunks():
+            for planes, n in iter_random(num_pi, n_vecs, args.seed, args.chunk):
+                with phases('good'):
+                    golden_planes = golden_chunk(planes, n)
+                yield planes, golden_planes, n
+    else:
+        def fill(out):
+            w0 = 0
+            for planes, n in pi_chunks():
+                out[:, w0:w0 + planes.shape[1]] = golden_chunk(planes, n)
+                w0 += planes.shape[1]
+
+        with phases('good'):
+            # 'kyupy-pos' entries predate split_wide_cells and are wrong for wide cells
+            golden, golden_hit = cached_golden(args.bench, args.tests, 'kyupy-pos2',
+                                               (num_po, (n_vecs + WORD_BITS - 1) // WORD_BITS), fill,
+                                               use_cache=not args.no_cache)
+        say(NORMAL, 'Golden PO responses %s', 'from cache' if golden_hit else 'simulated')
+
+        def chunks():
+            w0 = 0
+            for planes, n in pi_chunks():
+                yield planes, golden[:, w0:w0 + planes.shape[1]], n
+                w0 += planes.shape[1]
+
+    # Tests are streamed from the .tests/.tpk file (fsim.patterns) or the random
+    # generator in chunks of bit-planes; every chunk simulates only the faults
+    # not yet detected.
+    sims = 0
+    cov = Coverage(total_faults, args.target_coverage, args.plateau)
+    useful = Useful(num_pi)
+    words = min(chunk_size(args.chunk), n_vecs + WORD_BITS - 1) // WORD_BITS  # largest chunk
+    with profiled(args.profile), SharedBuffer((num_pi + num_po) * words * 8, args.jobs) as buf, \
+            FaultPool(args.jobs, _fault_sim_setup, (circuit, po_c_indices), _fault_sim_task,
+                      _fault_sim_prepare) as pool:
+        for planes, golden_planes, n in chunks():
+            todo = [f for f in sim_faults if f not in detected_at]
+            if not todo:
+                break
+            say(NORMAL, '--- Test chunk: vectors %d..%d ---', sims, sims + n - 1)
+            io_planes = np.concatenate((planes, golden_planes))
+            if say.enabled(DEBUG):
+                ones_count = np.unpackbits(golden_planes[:10].view(np.uint8), axis=1).sum(axis=1)
+                say(DEBUG, '[dbg] PO ones_count (first %d): %s', len(ones_count), ones_count.tolist())
+            if trace:
+                trace.vectors(sims, io_planes, n)
+
+            # ===== Fault Simulation (compare directly in c) =====
+            slots = args.slots or max(1, min(len(todo), SLOT_BUDGET // (lsim.c.shape[0] * ((n + 7) // 8))))
+            say(NORMAL, '%d faults, %d faulty machines per c_prop', len(todo), slots)
+            with phases('fault'):
+                parts = pool.map(todo, buf.put(io_planes), n, slots)
+            first = [t for part in parts for t in part]
+            detected_at.update((f, sims + t) for f, t in zip(todo, first) if t >= 0)
+            record_batch(n, len(todo), sum(t >= 0 for t in first))
+            if args.save_useful:
+                useful.add(planes, (t for t in first if t >= 0))
+            sims += n
+            if cov.update(sims, len(cf.expand(detected_at)) if args.collapse != 'none' else len(detected_at)):
+                say(NORMAL, 'Stopped early: %s (of %d)', cov.reason, n_vecs)
+                break
+
+    if args.collapse != 'none':
+        collapsed_count = len(detected_at)
+        detected_at = cf.expand(detected_at)
+
+    detected_count = len(detected_at)
     coverage = (detected_count / total_faults) * 100.0 if total_faults else 0.0
-    log.info(f'\nTotal Faults: {total_faults}')
-    log.info(f'Detected Faults: {detected_count}')
-    log.info(f'Fault Coverage: {coverage:.2f}%')
-    log.info(f'Detected faults: {sorted(detected_faults)}')
+    say(QUIET, 'Total Faults: %d', total_faults)
+    say(QUIET, 'Detected Faults: %d', detected_count)
+    say(QUIET, 'Fault Coverage: %.2f%%%s', coverage, ' (lower bound)' if args.collapse == 'dominance' else '')
+    if args.untestable:
+        testable = total_faults - len(untestable)
+        say(QUIET, 'Untestable Faults (static): %d', len(untestable))
+        say(QUIET, 'Testable Coverage: %.2f%%%s', detected_count / testable * 100.0 if testable else 100.0,
+            ' (lower bound)' if args.collapse == 'dominance' else '')
+    if args.collapse != 'none':
+        say(QUIET, 'Collapsed Faults (%s): %d / %d (%.2f%%)', args.collapse, collapsed_count, len(cf.reps),
+            collapsed_count / len(cf.reps) * 100.0)
+        if args.untestable:
+            say(QUIET, 'Collapsed Untestable Faults (static): %d', len(cf.reps) - len(sim_faults))
+    if args.save_useful:
+        if useful.save(args.save_useful, args.bench):
+            say(NORMAL, 'Useful vectors: %d of %d -> %s', useful.count, sims, args.save_useful)
+        else:
+            say(NORMAL, 'Useful vectors: none, %s not written', args.save_useful)
+    say(NORMAL, 'Counters: %s', summary())
+    if sampler:
+        sampler.stop()
+        log.info('Samples: ' + sampler.format())
+    if trace:
+        records = np.zeros(total_faults, dtype=FAULT_DTYPE)
+        records['fault'] = np.arange(total_faults)
+        records['line'], records['sa'] = np.array(all_faults, dtype=np.int64).reshape(-1, 2).T
+        records['vector'] = [detected_at.get(f, -1) for f in all_faults]
+        records['detected'] = records['vector'] >= 0
+        trace.faults(records)
+        trace.close()
+    report(phases, faults=total_faults, detected=detected_count, vectors=sims)
+    write_curve(args.curve, detected_at.values(), total_faults, sims)
+    report_faults([fault_name(sites[loc], sa) for loc, sa in all_faults],
+                  [fault_name(sites[loc], sa) for loc, sa in detected_at])
 
 
 if __name__ == '__main__':
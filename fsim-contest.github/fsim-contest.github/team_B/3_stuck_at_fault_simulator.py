@@ -2,9 +2,30 @@
 # -*- coding: utf-8 -*-
 
 import argparse
-import re
+import heapq
+import sys
 import time
-from collections import defaultdict, deque
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from fsim.cache import cached_golden, load_netlist
+from fsim.collapse import collapse_faults
+from fsim.cone import ConeIndex
+from fsim.coverage import Coverage, write_curve
+from fsim.coverage import add_arguments as add_coverage_arguments
+from fsim.levelsim import LevelPlan
+from fsim.netlist import OPNAMES, BUF, NOT, AND, NAND, OR, NOR, XOR, XNOR, INVERTING
+from fsim.parallel import FaultPool, merge_dicts
+from fsim.patterns import CHUNK, WORD_BITS, chunk_size, count_patterns, iter_patterns, valid_mask
+from fsim.randgen import Useful, check_arguments, iter_random
+from fsim.randgen import add_arguments as add_random_arguments
+from fsim.redundancy import Redundancy
+from fsim.shm import SharedBuffer, attach
+from fsim.stats import Phases, add_arguments, counters, profiled, record_batch, report, start_sampler, summary
+from fsim.verify import fault_name, report_faults, site_name
 
 # -------------------------------
 # BENCH 解析
@@ -17,68 +38,25 @@ def net_name(s):
     except ValueError:
         return s
 
-def parse_bench(path):
-    pis, pos = [], []
-    raw_gates = []
-    gid = 0
-
-    with open(path, 'r', encoding='utf-8') as f:
-        for raw in f:
-            line = raw.strip()
-            if not line or line.startswith('#'):
-                continue
-
-            m = re.match(r'INPUT\(([^)]+)\)', line, re.IGNORECASE)
-            if m:
-                pis.append(net_name(m.group(1).strip()))
-                continue
-
-            m = re.match(r'OUTPUT\(([^)]+)\)', line, re.IGNORECASE)
-            if m:
-                pos.append(net_name(m.group(1).strip()))
-                continue
-
-            m = re.match(r'([^=]+)=\s*([A-Za-z]+)\(([^)]*)\)', line)
-            if m:
-                out = net_name(m.group(1))
-                gtype = m.group(2).upper()
-                args = m.group(3).strip()
-                ins = [] if args == '' else [net_name(a.strip()) for a in args.split(',')]
-                raw_gates.append({"id": gid, "type": gtype, "ins": ins, "out": out})
-                gid += 1
-
-    producer = {g["out"]: g["id"] for g in raw_gates}
-
-    indeg = {g["id"]: 0 for g in raw_gates}
-    fanouts_gates = defaultdict(list)
-    for g in raw_gates:
-        for n in g["ins"]:
-            if n in producer:
-                p = producer[n]
-                indeg[g["id"]] += 1
-                fanouts_gates[p].append(g["id"])
-
-    q = deque([gid for gid, d in indeg.items() if d == 0])
-    topo = []
-    while q:
-        u = q.popleft()
-        topo.append(u)
-        for v in fanouts_gates[u]:
-            indeg[v] -= 1
-            if indeg[v] == 0:
-                q.append(v)
-
-    if len(topo) != len(raw_gates):
-        raise ValueError("Netlist is not a DAG or parsing failed (topological sort incomplete).")
-
-    gid2gate = {}
-    gid_to_topo_idx = {}
+def parse_bench(path, use_cache=True):
+    """Build team_B's netlist dict from the (cached) compiled netlist.
+
+    Gates come out of the compiler already levelized, so no topological
+    sort is needed here; "id" keeps the gate's position in the bench file.
+    """
+    cnl, timings = load_netlist(path, use_cache)
+    names = [net_name(n) for n in cnl.names]
+    pis = names[:cnl.n_pis]
+    pos = [names[p] for p in cnl.pos.tolist()]
+    op, ptr, fanin, _, _ = cnl.as_lists()
     gates = []
-    for i, gid in enumerate(topo):
-        g = next(x for x in raw_gates if x["id"] == gid)
-        gates.append(g)
-        gid2gate[gid] = g
-        gid_to_topo_idx[gid] = i
+    for g, gid in enumerate(cnl.gate_src.tolist()):
+        gates.append({"id": gid, "type": OPNAMES[op[g]],
+                      "ins": [names[u] for u in fanin[ptr[g]:ptr[g + 1]]], "out": names[cnl.n_pis + g]})
+
+    gid2gate = {g["id"]: g for g in gates}
+    gid_to_topo_idx = {g["id"]: i for i, g in enumerate(gates)}
+    producer = {g["out"]: g["id"] for g in gates}
 
     lines = []
     for g in gates:
@@ -91,149 +69,551 @@ def parse_bench(path):
         for pidx, n in enumerate(g["ins"]):
             net_to_fanout_pins[n].append((g["id"], pidx))
 
-    # 預先排序 fanout gate ID
-    net_to_sorted_fan_gids = {
-        net: sorted({gid for gid, _ in pins}, key=lambda g: gid_to_topo_idx[g])
-        for net, pins in net_to_fanout_pins.items()
-    }
-
     return {
+        "names": names,
         "pis": pis,
         "pos": pos,
         "gates": gates,
         "lines": lines,
-        "producer": {g["out"]: g["id"] for g in gates},
+        "producer": producer,
         "gid2gate": gid2gate,
         "net_to_fanout_pins": net_to_fanout_pins,
-        "net_to_sorted_fan_gids": net_to_sorted_fan_gids,
         "gid_to_topo_idx": gid_to_topo_idx,
-        "fanouts_gates": fanouts_gates,
+        "cnl": cnl,
+        "timings": timings,
     }
 
+def canonical_sites(nl):
+    """fsim.verify site name of every line in nl["lines"] (a single-reader pin is the stem)."""
+    orig = dict(zip(nl["names"], nl["cnl"].names))
+    pos = set(nl["pos"])
+    sites = []
+    for kind, net, gid, pidx in nl["lines"]:
+        if kind == "stem" or len(nl["net_to_fanout_pins"][net]) + (net in pos) < 2:
+            sites.append(site_name(orig[net]))
+        else:
+            sites.append(site_name(orig[net], orig[nl["gid2gate"][gid]["out"]], pidx))
+    return sites
+
+def collapse_structure(nl):
+    """nl["lines"] as fsim.collapse gates/links: line index per pin, stem<->single branch links."""
+    stem_of, pin_of = {}, {}
+    branches = defaultdict(list)
+    for lidx, (kind, net, gid, pidx) in enumerate(nl["lines"]):
+        if kind == "stem":
+            stem_of[gid] = lidx
+        else:
+            pin_of[(gid, pidx)] = lidx
+            branches[net].append(lidx)
+    gates = [(g["type"], [pin_of[(g["id"], p)] for p in range(len(g["ins"]))], stem_of[g["id"]])
+             for g in nl["gates"]]
+    pos = set(nl["pos"])
+    links = [(stem_of[nl["producer"][net]], br[0]) for net, br in branches.items()
+             if len(br) == 1 and net in nl["producer"] and net not in pos]
+    return gates, links
+
+def compile_lines(nl):
+    """Compiled netlist of nl plus the compiled site of every nl["lines"] entry.
+
+    A site is ("stem", net_id, None) or ("branch", gate_idx, pin).
+    """
+    cnl = nl["cnl"]
+    cidx = nl["gid_to_topo_idx"]  # compiled gate index = position in the levelized gate list
+    sites = []
+    for kind, _, gid, pidx in nl["lines"]:
+        if kind == "stem":
+            sites.append(("stem", cnl.n_pis + cidx[gid], None))
+        else:
+            sites.append(("branch", cidx[gid], pidx))
+    return cnl, sites
+
+def site_untestable(red, site, sa):
+    """Whether fsim.redundancy proves the fault sa at a compiled site untestable."""
+    kind, a, pin = site
+    return red.stem(a, sa) if kind == "stem" else red.branch(a, pin, sa)
+
 # -------------------------------
-# Gate eval
+# Bit-parallel 模擬 (64 patterns / word)
 # -------------------------------
-
-def eval_gate(gtype, in_vals):
-    if gtype in ("BUF", "BUFF"):
-        return in_vals[0]
-    if gtype == "NOT":
-        return 1 - in_vals[0]
-    if gtype == "AND":
-        v = 1
-        for a in in_vals: v &= a
-        return v
-    if gtype == "NAND":
-        return 1 - eval_gate("AND", in_vals)
-    if gtype == "OR":
-        v = 0
-        for a in in_vals: v |= a
-        return v
-    if gtype == "NOR":
-        return 1 - eval_gate("OR", in_vals)
-    if gtype == "XOR":
-        v = 0
-        for a in in_vals: v ^= a
-        return v
-    if gtype == "XNOR":
-        return 1 - eval_gate("XOR", in_vals)
-    raise ValueError(f"Unsupported gate: {gtype}")
+# Test vectors are streamed in chunks of bit-planes (fsim.patterns): bit
+# (t % 64) of word (t // 64) is vector t of the chunk.  The engines get the
+# good values of a chunk as a (n_nets, n_words) matrix, see main().
+
+def eval_op_packed(op, ins):
+    """Evaluate one gate over packed words; ins is a sequence of word arrays."""
+    if op in (BUF, NOT):
+        v = ins[0]
+    elif op in (AND, NAND):
+        v = ins[0]
+        for a in ins[1:]: v = v & a
+    elif op in (OR, NOR):
+        v = ins[0]
+        for a in ins[1:]: v = v | a
+    elif op in (XOR, XNOR):
+        v = ins[0]
+        for a in ins[1:]: v = v ^ a
+    else:
+        raise ValueError(f"Unsupported opcode: {op}")
+    return ~v if op in INVERTING else v
+
+def simulate_good_packed(plan, pi_words):
+    """One level-batched pass (fsim.levelsim) evaluates every vector at once.
+
+    Returns a (n_nets, n_words) uint64 array indexed by compiled net id.
+    """
+    vals = plan.simulate(pi_words)
+    counters["gates"] += plan.n_gates
+    counters["words"] += plan.n_gates * pi_words.shape[1]
+    return vals
+
+def vector_bits(good, t_idx):
+    """Good value (0/1) of every net under vector t_idx, as a list by net id."""
+    w, b = divmod(t_idx, WORD_BITS)
+    return ((good[:, w] >> np.uint64(b)) & np.uint64(1)).tolist()
+
+def first_set_bit(words):
+    """Index of the lowest set bit over a word array, or None if all zero."""
+    nz = np.flatnonzero(words)
+    if nz.size == 0:
+        return None
+    w = int(words[nz[0]])
+    return int(nz[0]) * WORD_BITS + (w & -w).bit_length() - 1
+
+def difference_sim_packed(cnl, lists, idx, good, site, sa, valid):
+    """Propagate one fault over all packed vectors, in topological order.
+
+    Gate ids are levelized, so a min-heap of gate ids visits gates in order.
+    Returns the word mask of vectors that detect the fault (or None).
+    """
+    op, ptr, fanin, fptr, fanout = lists
+    npi = cnl.n_pis
+    kind, a, pin = site
+    if not idx.observable(npi + a if kind == "branch" else a):
+        return None
+    forced = valid if sa else np.zeros_like(valid)
+    if kind == "branch":
+        ins = [good[u] for u in fanin[ptr[a]:ptr[a + 1]]]
+        ins[pin] = forced
+        net = npi + a
+        bad = eval_op_packed(op[a], ins)
+        counters["gates"] += 1
+        counters["words"] += len(valid)
+    else:
+        net = a
+        bad = forced
+    if not ((bad ^ good[net]) & valid).any():
+        return None
+    det = propagate_packed(cnl, lists, idx, good, net, bad, valid)
+    return det if det.any() else None
+
+def propagate_packed(cnl, lists, idx, good, net, bad, valid):
+    """Push the faulty words bad of net to the POs; returns the detection word mask.
+
+    Only gates of the fanout cone that reach a PO (idx.live) are scheduled
+    and only the POs reachable from net are compared.
+    """
+    op, ptr, fanin, fptr, fanout = lists
+    npi, live = cnl.n_pis, idx.live
+    work = {net: bad}
+    q = [g for g in fanout[fptr[net]:fptr[net + 1]] if live[g]]
+    heapq.heapify(q)
+    queued = set(q)
+    evals = len(q)
+    while q:
+        g = heapq.heappop(q)
+        out = npi + g
+        bad = eval_op_packed(op[g], [work[u] if u in work else good[u]
+                                     for u in fanin[ptr[g]:ptr[g + 1]]])
+        if not ((bad ^ good[out]) & valid).any():
+            continue
+        work[out] = bad
+        for nxt in fanout[fptr[out]:fptr[out + 1]]:
+            if live[nxt] and nxt not in queued:
+                queued.add(nxt)
+                heapq.heappush(q, nxt)
+                evals += 1
+    counters["gates"] += evals
+    counters["events"] += len(work)
+    counters["words"] += evals * len(valid)
+
+    det = np.zeros_like(valid)
+    for po in idx.pos(net):
+        if po in work:
+            det |= work[po] ^ good[po]
+    return det & valid
 
 # -------------------------------
-# 測試讀取
+# Critical path tracing (fanout-free regions)
 # -------------------------------
+# Inside a fanout-free region (FFR) a fault has exactly one path to the
+# region's stem, so whether flipping a line is observable there follows from
+# the good values alone (backward critical path tracing).  Only the stems are
+# flip-simulated to the POs; every fault in the region is then resolved from
+# its stem's observability mask.
+
+def ffr_stems(cnl, lists):
+    """Gate outputs heading an FFR: POs and nets not read by exactly one pin."""
+    fptr = lists[3]
+    pos = set(cnl.pos.tolist())
+    return [n for n in range(cnl.n_pis, cnl.n_nets) if n in pos or fptr[n + 1] - fptr[n] != 1]
+
+def pin_sensitivity(op, ins, pin, ones):
+    """Words in which flipping input pin alone flips the gate output."""
+    s = ones
+    if op in (AND, NAND):
+        for k, v in enumerate(ins):
+            if k != pin: s = s & v
+    elif op in (OR, NOR):
+        for k, v in enumerate(ins):
+            if k != pin: s = s & ~v
+    return s
+
+def critical_path_trace(cnl, lists, good, stem_obs, valid):
+    """Backward pass from the stems over the gates in reverse level order.
+
+    Returns (net_obs, pin_obs): observability word masks per net id (None for
+    PIs) and per fanin CSR position.
+    """
+    op, ptr, fanin, _, _ = lists
+    npi = cnl.n_pis
+    zero = np.zeros_like(valid)
+    net_obs = [None] * cnl.n_nets
+    pin_obs = [zero] * len(fanin)
+    for n, obs in stem_obs.items():
+        net_obs[n] = obs
+    evals = 0
+    for g in range(cnl.n_gates - 1, -1, -1):
+        obs = net_obs[npi + g]  # set: a stem, or the only reader is a later gate
+        live = bool(obs.any())
+        evals += live
+        ins = [good[u] for u in fanin[ptr[g]:ptr[g + 1]]] if live else None
+        for k in range(ptr[g], ptr[g + 1]):
+            if live:
+                pin_obs[k] = obs & pin_sensitivity(op[g], ins, k - ptr[g], valid)
+            u = fanin[k]
+            if u >= npi and net_obs[u] is None:
+                net_obs[u] = pin_obs[k]
+    counters["gates"] += evals
+    counters["words"] += evals * len(valid)
+    return net_obs, pin_obs
 
-def read_tests(path, num_pis):
-    vecs = []
-    with open(path, 'r', encoding='utf-8') as f:
-        for raw in f:
-            bits = re.findall(r'[01]', raw)
-            if len(bits) >= num_pis:
-                vecs.append([int(b) for b in bits[:num_pis]])
-    return vecs
+# -------------------------------
+# Event-driven 差分模擬 (one vector at a time)
+# -------------------------------
+# The serial engine writes a fault's values straight into the good-value list
+# of the current vector and flips the touched nets back afterwards, so
+# nothing is allocated per fault.  Gates to re-evaluate wait in one bucket per
+# level (cnl.level): a gate is evaluated only after all of its fanins have
+# settled, and at most once per fault.
+
+def eval_op_bit(op, ins):
+    """Evaluate one gate over 0/1 ints."""
+    v = ins[0]
+    if op in (AND, NAND):
+        for a in ins[1:]: v &= a
+    elif op in (OR, NOR):
+        for a in ins[1:]: v |= a
+    elif op in (XOR, XNOR):
+        for a in ins[1:]: v ^= a
+    elif op not in (BUF, NOT):
+        raise ValueError(f"Unsupported opcode: {op}")
+    return v ^ 1 if op in INVERTING else v
+
+def event_setup(cnl, lists, idx):
+    """Reusable scratch state of difference_sim_event: level buckets, per-gate/PO flags
+    and, per net, its readers that reach a PO (idx.live), so dead gates are never queued."""
+    op, ptr, fanin, fptr, fanout = lists
+    is_po = bytearray(cnl.n_nets)
+    for po in cnl.pos.tolist():
+        is_po[po] = 1
+    live = idx.live
+    readers = [[g for g in fanout[fptr[n]:fptr[n + 1]] if live[g]] for n in range(cnl.n_nets)]
+    buckets = [[] for _ in range(cnl.depth + 1)]
+    return cnl.n_pis, (op, ptr, fanin, readers), cnl.level.tolist(), buckets, bytearray(cnl.n_gates), is_po
+
+def difference_sim_event(ev, vals, site, sa):
+    """Whether the fault at site is seen at a PO under one vector.
+
+    vals holds the good value (0/1) of every net id; it is changed while the
+    fault propagates and restored before returning.
+    """
+    npi, (op, ptr, fanin, readers), level, buckets, queued, is_po = ev
+    kind, a, pin = site
+    evals = 0
+    if kind == "branch":
+        ins = [vals[u] for u in fanin[ptr[a]:ptr[a + 1]]]
+        if ins[pin] == sa:
+            return False
+        ins[pin] = sa
+        net, bad = npi + a, eval_op_bit(op[a], ins)
+        evals += 1
+    else:
+        net, bad = a, sa
+    if bad == vals[net]:
+        counters["gates"] += evals
+        return False
+
+    vals[net] = bad
+    touched, scheduled = [net], []
+    detected = bool(is_po[net])
+    hi = level[net - npi] if net >= npi else 0  # highest level with a queued gate
+    first = hi + 1
+    if not detected:
+        for g in readers[net]:
+            if not queued[g]:
+                queued[g] = 1
+                scheduled.append(g)
+                buckets[level[g]].append(g)
+                if level[g] > hi: hi = level[g]
+    lv = first
+    while not detected and lv <= hi:
+        for g in buckets[lv]:
+            out = npi + g
+            evals += 1
+            # vals[out] is still the good value: only g itself writes it
+            if eval_op_bit(op[g], [vals[u] for u in fanin[ptr[g]:ptr[g + 1]]]) == vals[out]:
+                continue
+            vals[out] ^= 1
+            touched.append(out)
+            if is_po[out]:
+                detected = True
+                break
+            for nxt in readers[out]:
+                if not queued[nxt]:
+                    queued[nxt] = 1
+                    scheduled.append(nxt)
+                    buckets[level[nxt]].append(nxt)
+                    if level[nxt] > hi: hi = level[nxt]
+        lv += 1
+
+    for n in touched:
+        vals[n] ^= 1
+    for g in scheduled:
+        queued[g] = 0
+    for b in range(first, hi + 1):
+        buckets[b].clear()
+    counters["gates"] += evals
+    counters["events"] += len(touched)
+    return detected
 
 # -------------------------------
-# 模擬
+# Deductive 故障模擬 (fault list = int bitset)
 # -------------------------------
 
-def simulate_good(nl, vec_bits):
-    net_val = {}
-    for i, n in enumerate(nl["pis"]):
-        net_val[n] = vec_bits[i]
-    for g in nl["gates"]:
-        ins = [net_val[n] for n in g["ins"]]
-        net_val[g["out"]] = eval_gate(g["type"], ins)
-    return net_val
+CONTROLLING = {AND: 0, NAND: 0, OR: 1, NOR: 1}
+
+def fault_id(lidx, sa):
+    return 2 * lidx + sa
+
+def deduce_gate(op, pin_vals, pin_lists):
+    """Output fault list of a gate from its input values and input fault lists."""
+    if op in CONTROLLING:
+        c = CONTROLLING[op]
+        on_c = [L for v, L in zip(pin_vals, pin_lists) if v == c]
+        if not on_c:
+            out = 0
+            for L in pin_lists: out |= L
+            return out
+        inter = on_c[0]
+        for L in on_c[1:]: inter &= L
+        rest = 0
+        for v, L in zip(pin_vals, pin_lists):
+            if v != c: rest |= L
+        return inter & ~rest
+    if op in (XOR, XNOR):
+        out = 0
+        for L in pin_lists: out ^= L
+        return out
+    if op in (BUF, NOT):
+        return pin_lists[0]
+    raise ValueError(f"Unsupported opcode: {op}")
+
+def deductive_sim(cnl, lists, good, stem_fid, pin_fid, alive):
+    """One pass over the gates; good holds one 0/1 per net id.
+
+    Returns the bitset of faults seen at any PO.
+    """
+    op, ptr, fanin, _, _ = lists
+    npi = cnl.n_pis
+    fl = [0] * cnl.n_nets
+    for g, o in enumerate(op):
+        pin_vals, pin_lists = [], []
+        for p in range(ptr[g], ptr[g + 1]):
+            u = fanin[p]
+            v = good[u]
+            pin_vals.append(v)
+            pin_lists.append(fl[u] | (1 << (pin_fid[p] + 1 - v)))
+        out = npi + g
+        L = deduce_gate(o, pin_vals, pin_lists)
+        fl[out] = (L | (1 << (stem_fid[g] + 1 - good[out]))) & alive
+    counters["gates"] += len(op)
+    counters["events"] += sum(1 for L in fl if L)
+    det = 0
+    for po in cnl.pos.tolist():
+        det |= fl[po]
+    return det
 
 # -------------------------------
-# 差分模擬 (branch/stem)
+# 故障模擬 drivers
 # -------------------------------
 
-def difference_sim_branch(nl, good_net, line, sa, pos_list, golden_pos_t):
-    _, src_net, tgt_gid, pin_idx = line
-    tgt_gate = nl["gid2gate"][tgt_gid]
+# Each engine is split into a per-run setup (built once per worker), a
+# per-chunk prepare that attaches the chunk's good values and a task over a
+# chunk of faults, see fsim.parallel.FaultPool.
 
-    ins = [sa if pidx == pin_idx else good_net[n] for pidx, n in enumerate(tgt_gate["ins"])]
-    new_out = eval_gate(tgt_gate["type"], ins)
-    if new_out == good_net[tgt_gate["out"]]:
-        return None
+def _serial_setup(cnl, sites, no_early_stop):
+    lists = cnl.as_lists()
+    return event_setup(cnl, lists, ConeIndex(cnl, lists)), sites, no_early_stop
 
-    work = {tgt_gate["out"]: new_out}
-    if tgt_gate["out"] in pos_list:
-        bad_t = tuple(work.get(po, good_net[po]) for po in pos_list)
-        if bad_t != golden_pos_t:
-            return True
+def _serial_prepare(state, good_ref, n_vecs):
+    ev, sites, no_early_stop = state
+    return ev, sites, attach(good_ref), n_vecs, no_early_stop
 
-    q = [(nl["gid_to_topo_idx"][tgt_gid], tgt_gid)]
-    visited = set()
-    while q:
-        _, gid = q.pop(0)
-        for fan_gid in nl["fanouts_gates"].get(gid, []):
-            if fan_gid in visited:
-                continue
-            visited.add(fan_gid)
-            gg = nl["gid2gate"][fan_gid]
-            ins2 = [work.get(n, good_net[n]) for n in gg["ins"]]
-            new_out2 = eval_gate(gg["type"], ins2)
-            if new_out2 != good_net[gg["out"]]:
-                work[gg["out"]] = new_out2
-                if gg["out"] in pos_list:
-                    bad_t = tuple(work.get(po, good_net[po]) for po in pos_list)
-                    if bad_t != golden_pos_t:
-                        return True
-                q.append((nl["gid_to_topo_idx"][fan_gid], fan_gid))
-    return None
-
-def difference_sim_stem(nl, good_net, line, sa, pos_list, golden_pos_t):
-    _, net, src_gid, _ = line
-    if good_net.get(net, 0) == sa:
-        return None
+def _serial_task(state, faults):
+    ev, sites, good, n_vecs, no_early_stop = state
+    detected_at = {}
+    for t_idx in range(n_vecs):
+        to_check = faults if no_early_stop else [(lidx, line, sa)
+                         for (lidx, line, sa) in faults if (lidx, sa) not in detected_at]
+        if not to_check:
+            break
+        vals = vector_bits(good, t_idx)
+        for (lidx, _, sa) in to_check:
+            if difference_sim_event(ev, vals, sites[lidx], sa) and (lidx, sa) not in detected_at:
+                detected_at[(lidx, sa)] = t_idx
+    return detected_at
 
-    work = {net: sa}
-    if net in pos_list:
-        bad_t = tuple(work.get(po, good_net[po]) for po in pos_list)
-        if bad_t != golden_pos_t:
-            return True
+def _packed_setup(cnl, sites):
+    lists = cnl.as_lists()
+    return cnl, lists, ConeIndex(cnl, lists), sites
 
-    q = deque(nl["net_to_sorted_fan_gids"].get(net, []))
-    visited = set()
-    while q:
-        gid = q.popleft()
-        if gid in visited:
-            continue
-        visited.add(gid)
-        gg = nl["gid2gate"][gid]
-        ins2 = [work.get(n, good_net[n]) for n in gg["ins"]]
-        new_out2 = eval_gate(gg["type"], ins2)
-        if new_out2 != good_net[gg["out"]]:
-            work[gg["out"]] = new_out2
-            if gg["out"] in pos_list:
-                bad_t = tuple(work.get(po, good_net[po]) for po in pos_list)
-                if bad_t != golden_pos_t:
-                    return True
-            for nxt in nl["fanouts_gates"].get(gid, []):
-                q.append(nxt)
-    return None
+def _with_good(state, good_ref, n_vecs):
+    """prepare of the engines whose state ends in (good, valid)."""
+    return (*state, attach(good_ref), valid_mask(n_vecs))
+
+def _packed_task(state, faults):
+    cnl, lists, idx, sites, good, valid = state
+    detected_at = {}
+    for (lidx, _, sa) in faults:
+        det = difference_sim_packed(cnl, lists, idx, good, sites[lidx], sa, valid)
+        if det is not None:
+            detected_at[(lidx, sa)] = first_set_bit(det)
+    return detected_at
+
+# Level-batched parallel-fault simulation: every fault of a batch gets its own
+# copy of the circuit along a second axis, vals[net, machine, word], and all
+# copies are evaluated together one (level, op, fan-in) group at a time.  A
+# fault is injected right after the group that computes its site.
+
+LEVEL_BUDGET = 32 << 20  # bytes of vals per batch
+
+def _level_setup(cnl, sites):
+    return cnl, cnl.as_lists(), LevelPlan(cnl), sites
+
+def _level_task(state, faults):
+    cnl, lists, plan, sites, good, valid = state
+    op, ptr, fanin = lists[:3]
+    npi, pos = cnl.n_pis, cnl.pos
+    batch = max(1, min(len(faults), LEVEL_BUDGET // (cnl.n_nets * len(valid) * 8)))
+    vals = np.empty((cnl.n_nets, batch, len(valid)), dtype=np.uint64)
+    zero = np.zeros_like(valid)
+    detected_at = {}
+    for f0 in range(0, len(faults), batch):
+        group = faults[f0:f0 + batch]
+        stems, branches = defaultdict(list), defaultdict(list)  # group index -> injections
+        for k, (lidx, _, sa) in enumerate(group):
+            kind, a, pin = sites[lidx]
+            forced = valid if sa else zero
+            if kind == "stem":
+                stems[plan.group_of[a - npi]].append((a, k, forced))
+            else:
+                branches[plan.group_of[a]].append((a, pin, k, forced))
+
+        def inject(i):
+            def run(out):
+                for a, k, forced in stems.get(i, ()):
+                    out[a, k] = forced
+                for a, pin, k, forced in branches.get(i, ()):
+                    ins = [out[u, k] for u in fanin[ptr[a]:ptr[a + 1]]]
+                    ins[pin] = forced
+                    out[npi + a, k] = eval_op_packed(op[a], ins)
+            return run
+
+        plan.simulate(good[:npi, np.newaxis], vals, {i: inject(i) for i in set(stems) | set(branches)})
+        diff = np.bitwise_or.reduce(vals[pos, :len(group)] ^ good[pos, np.newaxis], axis=0) & valid
+        for k in np.flatnonzero(diff.any(axis=1)).tolist():
+            lidx, _, sa = group[k]
+            detected_at[(lidx, sa)] = first_set_bit(diff[k])
+    n_batches = (len(faults) + batch - 1) // batch
+    counters["gates"] += n_batches * batch * plan.n_gates
+    counters["words"] += n_batches * batch * plan.n_gates * len(valid)
+    return detected_at
+
+def _deductive_setup(cnl, sites, no_early_stop):
+    lists = cnl.as_lists()
+    stem_fid = [0] * cnl.n_gates
+    pin_fid = [0] * len(lists[2])
+    for lidx, (kind, a, pin) in enumerate(sites):
+        if kind == "stem":
+            stem_fid[a - cnl.n_pis] = fault_id(lidx, 0)
+        else:
+            pin_fid[lists[1][a] + pin] = fault_id(lidx, 0)
+    return cnl, lists, stem_fid, pin_fid, no_early_stop
+
+def _deductive_prepare(state, good_ref, n_vecs):
+    cnl, lists, stem_fid, pin_fid, no_early_stop = state
+    return cnl, lists, stem_fid, pin_fid, attach(good_ref), n_vecs, no_early_stop
+
+def _deductive_task(state, faults):
+    cnl, lists, stem_fid, pin_fid, good, n_vecs, no_early_stop = state
+    alive = 0
+    for (lidx, _, sa) in faults:
+        alive |= 1 << fault_id(lidx, sa)
+
+    detected_at = {}
+    seen = 0
+    for t_idx in range(n_vecs):
+        if not alive:
+            break
+        new = deductive_sim(cnl, lists, vector_bits(good, t_idx), stem_fid, pin_fid, alive) & ~seen
+        seen |= new
+        if not no_early_stop:
+            alive &= ~new
+        while new:
+            low = new & -new
+            fid = low.bit_length() - 1
+            detected_at[(fid // 2, fid % 2)] = t_idx
+            new ^= low
+    return detected_at
+
+def _stem_obs_setup(cnl):
+    lists = cnl.as_lists()
+    return cnl, lists, ConeIndex(cnl, lists)
+
+def _stem_obs_task(state, stems):
+    cnl, lists, idx, good, valid = state
+    return {n: propagate_packed(cnl, lists, idx, good, n, ~good[n], valid) for n in stems}
+
+def run_cpt(pool, cnl, sites, good, good_ref, n_vecs, faults):
+    """One flip simulation per FFR stem (split over the _stem_obs pool), then CPT for all faults."""
+    valid = valid_mask(n_vecs)
+    lists = cnl.as_lists()
+    stem_obs = merge_dicts(pool.map(ffr_stems(cnl, lists), good_ref, n_vecs))
+    net_obs, pin_obs = critical_path_trace(cnl, lists, good, stem_obs, valid)
+
+    ptr, fanin = lists[1], lists[2]
+    detected_at = {}
+    for (lidx, _, sa) in faults:
+        kind, a, pin = sites[lidx]
+        if kind == "stem":
+            net, obs = a, net_obs[a]
+        else:
+            net, obs = fanin[ptr[a] + pin], pin_obs[ptr[a] + pin]
+        # detected where the fault is activated (good != sa) and observable
+        t_idx = first_set_bit(obs & (~good[net] if sa else good[net]))
+        if t_idx is not None:
+            detected_at[(lidx, sa)] = t_idx
+    return detected_at
 
 # -------------------------------
 # 主程式
@@ -242,56 +622,183 @@ def difference_sim_stem(nl, good_net, line, sa, pos_list, golden_pos_t):
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("bench")
-    ap.add_argument("tests")
+    ap.add_argument("tests", nargs="?", help=".tests text or packed .tpk file (or use --random)")
     ap.add_argument("--no-early-stop", action="store_true")
+    ap.add_argument("--no-cache", action="store_true", help="always re-parse the bench file")
+    ap.add_argument("--jobs", type=int, default=1, help="worker processes for the fault list (0 = all cores)")
+    ap.add_argument("--engine", choices=("serial", "packed", "level", "deductive", "cpt"), default="serial",
+                    help="serial: one vector at a time; packed: 64 vectors per uint64 word; "
+                         "level: packed vectors x a batch of faulty machines, evaluated level by level; "
+                         "deductive: all faults per vector via fault-list bitsets; "
+                         "cpt: packed stem simulation + critical path tracing inside fanout-free regions")
+    ap.add_argument("--collapse", choices=("none", "equiv", "dominance"), default="equiv",
+                    help="simulate only representative faults (equivalence, optionally + dominance)")
+    ap.add_argument("--chunk", type=int, default=CHUNK, help="test vectors read and simulated per chunk")
+    ap.add_argument("--untestable", action="store_true",
+                    help="prove faults untestable before simulation (fsim.redundancy), "
+                         "never simulate them and also report the testable coverage")
+    add_arguments(ap)
+    add_coverage_arguments(ap)
+    add_random_arguments(ap)
     args = ap.parse_args()
+    check_arguments(ap, args)
+    sampler = start_sampler(args.sample)
 
     t0 = time.time()
-    nl = parse_bench(args.bench)
-    vecs = read_tests(args.tests, len(nl["pis"]))
-    if not vecs:
-        raise ValueError("tests 讀不到任何有效向量。")
-
-    golden_nets = [simulate_good(nl, v) for v in vecs]
-    pos_list = nl["pos"]
-    golden_pos = [tuple(gn[po] for po in pos_list) for gn in golden_nets]
-
-    faults = [(idx, line, sa) for idx, line in enumerate(nl["lines"]) for sa in (0, 1)]
+    phases = Phases()
+    with phases("parse"):
+        nl = parse_bench(args.bench, use_cache=not args.no_cache)
+        all_faults = [(idx, sa) for idx in range(len(nl["lines"])) for sa in (0, 1)]
+        if args.collapse == "none":
+            sim_faults = all_faults
+        else:
+            gates, links = collapse_structure(nl)
+            cf = collapse_faults(all_faults, gates, links, dominance=args.collapse == "dominance")
+            sim_faults = cf.reps
+        faults = [(idx, nl["lines"][idx], sa) for idx, sa in sim_faults]
+
+        cnl, sites = compile_lines(nl)
+        # one worker pool for the whole run: the netlist goes to the workers
+        # once, every chunk only a handle to its good values in shared memory
+        if args.engine == "serial":
+            pool_args = _serial_setup, (cnl, sites, args.no_early_stop), _serial_task, _serial_prepare
+        elif args.engine == "packed":
+            pool_args = _packed_setup, (cnl, sites), _packed_task, _with_good
+        elif args.engine == "level":
+            pool_args = _level_setup, (cnl, sites), _level_task, _with_good
+        elif args.engine == "cpt":
+            pool_args = _stem_obs_setup, (cnl,), _stem_obs_task, _with_good
+        else:
+            pool_args = _deductive_setup, (cnl, sites, args.no_early_stop), _deductive_task, _deductive_prepare
+
+    # --untestable: a fault is untestable with its equivalence class
+    # representative; the proven representatives are never simulated
+    untestable = set()
+    if args.untestable:
+        with phases("static"):
+            red = Redundancy(cnl)
+            rep_of = cf.rep_of if args.collapse != "none" else {}
+            proven = {}
+            for f in all_faults:
+                r = rep_of.get(f, f)
+                if r not in proven:
+                    proven[r] = site_untestable(red, sites[r[0]], r[1])
+                if proven[r]:
+                    untestable.add(f)
+            faults = [f for f in faults if not proven[(f[0], f[2])]]
+
+    # good values of all nets under all tests, memory-mapped from the golden
+    # cache or simulated chunk by chunk while streaming the tests into it;
+    # with --random they are simulated per chunk as the vectors are drawn
+    good_nl = nl["cnl"]
+    step = chunk_size(args.chunk)
+    if args.random:
+        n_vecs, golden_hit = args.random, False
+        tests_name = f"random(seed={args.seed})"
+
+        def chunks():
+            plan = LevelPlan(good_nl)
+            for pi_words, n in iter_random(good_nl.n_pis, n_vecs, args.seed, step):
+                with phases("good"):
+                    good = simulate_good_packed(plan, pi_words) & valid_mask(n)
+                yield good, n
+    else:
+        n_vecs, tests_name = count_patterns(args.tests), args.tests
+        if not n_vecs:
+            raise ValueError("tests 讀不到任何有效向量。")
+
+        def fill(out):
+            w0 = 0
+            plan = LevelPlan(good_nl)
+            for pi_words, n in iter_patterns(args.tests, good_nl.n_pis, args.chunk, args.bench):
+                w1 = w0 + pi_words.shape[1]
+                out[:, w0:w1] = simulate_good_packed(plan, pi_words) & valid_mask(n)
+                w0 = w1
+
+        with phases("good"):
+            golden, golden_hit = cached_golden(args.bench, args.tests, "nets",
+                                               (good_nl.n_nets, (n_vecs + WORD_BITS - 1) // WORD_BITS),
+                                               fill, use_cache=not args.no_cache)
+
+        def chunks():
+            for t_base in range(0, n_vecs, step):
+                n = min(step, n_vecs - t_base)
+                yield golden[:, t_base // WORD_BITS:(t_base + n + WORD_BITS - 1) // WORD_BITS], n
+
+    # fault-simulate chunk by chunk; faults detected in a chunk are dropped
     detected_at = {}
-
-    for t_idx, v in enumerate(vecs):
-        to_check = faults if args.no_early_stop else [(lidx, line, sa)
-                         for (lidx, line, sa) in faults if (lidx, sa) not in detected_at]
-        if not to_check:
-            break
-        good_net = golden_nets[t_idx]
-        gpos_t = golden_pos[t_idx]
-        for (lidx, line, sa) in to_check:
-            if line[0] == "branch":
-                _, src_net, tgt_gid, pin_idx = line
-                seen = good_net[nl["gid2gate"][tgt_gid]["ins"][pin_idx]]
-                if seen == sa:
-                    continue
-                res = difference_sim_branch(nl, good_net, line, sa, pos_list, gpos_t)
-            else:
-                _, net, _, _ = line
-                if good_net.get(net, 0) == sa:
-                    continue
-                res = difference_sim_stem(nl, good_net, line, sa, pos_list, gpos_t)
-
-            if res and (lidx, sa) not in detected_at:
-                detected_at[(lidx, sa)] = t_idx
+    total_faults = len(nl["lines"]) * 2
+    cov = Coverage(total_faults, args.target_coverage, args.plateau)
+    useful = Useful(good_nl.n_pis)
+    simulated = 0
+    words = min(step, n_vecs + WORD_BITS - 1) // WORD_BITS  # largest chunk
+    with profiled(args.profile), SharedBuffer(good_nl.n_nets * words * 8, args.jobs) as buf, \
+            FaultPool(args.jobs, *pool_args) as pool:
+        for good, n in chunks():
+            t_base = simulated
+            todo = faults if args.no_early_stop else [f for f in faults if (f[0], f[2]) not in detected_at]
+            if not todo:
+                break
+            with phases("fault"):
+                good_ref = buf.put(good)
+                if args.engine == "cpt":
+                    found = run_cpt(pool, cnl, sites, good, good_ref, n, todo)
+                else:
+                    found = merge_dicts(pool.map(todo, good_ref, n))
+            before = len(detected_at)
+            new = [t_idx for key, t_idx in found.items() if key not in detected_at]
+            for key, t_idx in found.items():
+                detected_at.setdefault(key, t_base + t_idx)
+            record_batch(n, len(todo), len(detected_at) - before)
+            if args.save_useful:
+                useful.add(good[:good_nl.n_pis], new)  # PI nets come first
+            simulated = t_base + n
+            if cov.update(simulated, len(cf.expand(detected_at)) if args.collapse != "none" else len(detected_at)):
+                break
+
+    # the collapsed universe, including the representatives --untestable removed
+    collapsed_cnt, collapsed_total = len(detected_at), len(sim_faults)
+    if args.collapse != "none":
+        detected_at = cf.expand(detected_at)
 
     total_lines = len(nl["lines"])
-    total_faults = total_lines * 2
     detected_cnt = len(detected_at)
 
-    print(f"# File: bench={args.bench} tests={args.tests}")
+    print(f"# File: bench={args.bench} tests={tests_name}")
+    print("# " + "  ".join(f"{k.capitalize()}: {v:.3f} s" for k, v in nl["timings"].items()))
+    print(f"# Golden ({'cache' if golden_hit else 'simulated'}): {phases.times.get('good', 0.0):.3f} s")
+    if cov.reason:
+        print(f"# Stopped early: {cov.reason} (of {n_vecs})")
     print(f"# Lines: {total_lines}")
     print(f"# Faults: {total_faults}")
-    print(f"# Detected: {detected_cnt} / {total_faults} ({detected_cnt*100.0/total_faults:.2f}%)")
+    bound = " (lower bound)" if args.collapse == "dominance" else ""
+    print(f"# Detected: {detected_cnt} / {total_faults} ({detected_cnt*100.0/total_faults:.2f}%){bound}")
+    if args.untestable:
+        testable = total_faults - len(untestable)
+        print(f"# Untestable (static): {len(untestable)}")
+        print(f"# Testable coverage: {detected_cnt} / {testable} "
+              f"({detected_cnt*100.0/testable if testable else 100.0:.2f}%){bound}")
+    if args.collapse != "none":
+        print(f"# Collapsed ({args.collapse}): {collapsed_cnt} / {collapsed_total} "
+              f"({collapsed_cnt*100.0/collapsed_total:.2f}%)")
+        if args.untestable:
+            print(f"# Collapsed untestable (static): {collapsed_total - len(faults)}")
+    if args.save_useful:
+        if useful.save(args.save_useful, args.bench):
+            print(f"# Useful vectors: {useful.count} of {simulated} -> {args.save_useful}")
+        else:
+            print(f"# Useful vectors: none, {args.save_useful} not written")
     print(f"# Time: {time.time() - t0:.3f} s")
+    print(f"# Counters: {summary()}")
+    if sampler:
+        sampler.stop()
+        print("# " + sampler.format().replace("\n", "\n# "))
     print("=" * 90)
+    report(phases, faults=total_faults, detected=detected_cnt, vectors=simulated)
+    write_curve(args.curve, detected_at.values(), total_faults, simulated)
+    sites = canonical_sites(nl)
+    report_faults([fault_name(sites[idx], sa) for idx, sa in all_faults],
+                  [fault_name(sites[idx], sa) for idx, sa in detected_at])
 
 if __name__ == "__main__":
     main()
@@ -1,78 +1,129 @@
 import argparse
+import sys
 import time
 from pathlib import Path
 from collections import Counter
 
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from fsim.cache import cached_golden, load_netlist
+from fsim.codegen import load_kernel
+from fsim.cone import ConeIndex
+from fsim.coverage import Coverage, write_curve
+from fsim.coverage import add_arguments as add_coverage_arguments
+from fsim.levelsim import LevelPlan
+from fsim.netlist import BUF, NOT, AND, NAND, OR, NOR, XOR, XNOR
+from fsim.parallel import FaultPool
+from fsim.patterns import CHUNK, WORD_BITS, chunk_size, count_patterns, iter_patterns, valid_mask
+from fsim.randgen import Useful, check_arguments, iter_random
+from fsim.randgen import add_arguments as add_random_arguments
+from fsim.redundancy import Redundancy
+from fsim.shm import SharedBuffer, attach
+from fsim.stats import Phases, add_arguments, counters, profiled, record_batch, report, start_sampler, summary
+from fsim.verify import fault_name, report_faults, site_name
+
 t0 = time.perf_counter()
 def log(msg: str):
     dt = time.perf_counter() - t0
 
     print(f"# {dt:09.3f} - {msg}")
 
-def parse_bench(path: Path):
-    inputs, outputs, gates = [], [], []
-    def clean(s): return s.split('#',1)[0].strip()
-    for raw in path.read_text(encoding='utf-8').splitlines():
-        line = clean(raw)
-        if not line: continue
-        if line.startswith('INPUT(') and line.endswith(')'):
-            inputs.append(line[6:-1].strip())
-        elif line.startswith('OUTPUT(') and line.endswith(')'):
-            outputs.append(line[7:-1].strip())
-        elif '=' in line:
-            left, right = [t.strip() for t in line.split('=',1)]
-            gate, args = right.split('(',1)
-            ins = [t.strip() for t in args[:-1].split(',')] if args[:-1] else []
-            gates.append((left, gate.upper(), ins))
-    return inputs, outputs, gates
-
-def topo_order(inputs, gates):
-    known, order, seen = set(inputs), [], set()
-    while len(seen) < len(gates):
-        progressed = False
-        for out, gt, ins in gates:
-            if out in seen: continue
-            if all(u in known for u in ins):
-                order.append((out, gt, ins))
-                seen.add(out); known.add(out); progressed = True
-        if not progressed:
-            rem = [o for o,_,_ in gates if o not in seen]
-            raise RuntimeError(f"有環或未定義 net：{rem}")
-    return order
-
-def eval_gate(gt, xs):
-    if gt in ('BUF', 'BUFF'):  return xs[0]
-    if gt=='NOT':  return 0 if xs[0] else 1
-    if gt=='AND':  v=1;  [v:=v&x for x in xs]; return v
-    if gt=='NAND': v=1;  [v:=v&x for x in xs]; return 0 if v else 1
-    if gt=='OR':   v=0;  [v:=v|x for x in xs]; return v
-    if gt=='NOR':  v=0;  [v:=v|x for x in xs]; return 0 if v else 1
-    if gt=='XOR':  v=0;  [v:=v^x for x in xs]; return v
-    if gt=='XNOR': v=0;  [v:=v^x for x in xs]; return 0 if v else 1
-    raise RuntimeError(f"不支援的 gate：{gt}")
-
-def simulate_baseline(inputs, outputs, order, tests):
-    base = []
-    for vec in tests:
-        if len(vec) != len(inputs):
-            raise ValueError(f"Vector len={len(vec)} != #inputs={len(inputs)}")
-        nets = {name:(1 if vec[i]=='1' else 0) for i,name in enumerate(inputs)}
-        for out, gt, ins in order:
-            nets[out] = eval_gate(gt, [nets[u] for u in ins])
-        base.append([nets.get(o,0) for o in outputs])
+
+def eval_word(op, xs, mask):
+    if op==BUF:  return xs[0]
+    if op==NOT:  return ~xs[0] & mask
+    if op==AND:  v=mask; [v:=v&x for x in xs]; return v
+    if op==NAND: v=mask; [v:=v&x for x in xs]; return ~v & mask
+    if op==OR:   v=0;    [v:=v|x for x in xs]; return v
+    if op==NOR:  v=0;    [v:=v|x for x in xs]; return ~v & mask
+    if op==XOR:  v=0;    [v:=v^x for x in xs]; return v
+    if op==XNOR: v=0;    [v:=v^x for x in xs]; return ~v & mask
+    raise RuntimeError(f"不支援的 opcode：{op}")
+
+def simulate_baseline(plan, planes, n):
+    """Fault-free 模擬整個 chunk，回傳 (n_nets, words)，padding bits 清為 0。
+
+    plan 是 fsim.levelsim.LevelPlan（逐 level 成批計算），--codegen 時則是
+    fsim.codegen 產生的 kernel（simulate() 是一個 net 一行的 straight-line 程式碼）。
+    """
+    if isinstance(plan, LevelPlan):
+        base = plan.simulate(planes) & valid_mask(n)
+    else:
+        base = np.stack(plan.simulate(list(planes), ~np.uint64(0))) & valid_mask(n)
+    n_gates = base.shape[0] - planes.shape[0]
+    counters["gates"] += n_gates
+    counters["words"] += n_gates * base.shape[1]
     return base
 
-def detect_fault(inputs, outputs, order, tests, base, net, sa):
-    for i, vec in enumerate(tests):
-        nets = {name:(1 if vec[j]=='1' else 0) for j,name in enumerate(inputs)}
-        if net in nets: nets[net] = sa
-        for out, gt, ins in order:
-            v = eval_gate(gt, [nets[u] for u in ins])
-            if out == net: v = sa
-            nets[out] = v
-        if [nets.get(o,0) for o in outputs] != base[i]:
-            return True
-    return False
+def detect_faults_ppsfp(cnl, idx, words, base, faults, kernel=None):
+    """Parallel-pattern single-fault propagation.
+
+    每個 fault (net id, sa) 注入後只沿 fanout cone（idx：fsim.cone.ConeIndex）傳播，
+    只比較 cone 到得了的 PO；到不了任何 PO 的 fault 一開始就排除。
+    一旦在某個 word 被偵測到就 drop，不再模擬之後的 words。
+    kernel（--codegen，fsim.codegen）有該 net 的 cone 函式時改用產生的 straight-line 程式碼。
+    回傳 {fault: 第一個偵測到它的 vector（從 words 開頭算）}。
+    """
+    cone_fns = kernel.CONES if kernel else {}
+    cone_gates = kernel.CONE_GATES if kernel else {}
+    op, ptr, fanin, _, _ = cnl.as_lists()
+    npi = cnl.n_pis
+    detected = {}
+    remaining = [f for f in faults if idx.observable(f[0])]
+    evals = events = 0
+    for w, ((mask, _), good) in enumerate(zip(words, base)):
+        if not remaining: break
+        alive = []
+        for net, sa in remaining:
+            forced = mask if sa else 0
+            if good[net] == forced:
+                alive.append((net, sa)); continue
+            fn = cone_fns.get(net)
+            if fn is not None:
+                evals += cone_gates[net]
+                d = fn(good, forced, mask)
+                if d:
+                    detected[(net, sa)] = w * WORD_BITS + (d & -d).bit_length() - 1
+                else:
+                    alive.append((net, sa))
+                continue
+            bad = {net: forced}
+            for g in idx.cone(net):
+                ins = fanin[ptr[g]:ptr[g+1]]
+                if not any(u in bad for u in ins): continue
+                v = eval_word(op[g], [bad.get(u, good[u]) for u in ins], mask)
+                evals += 1
+                if v != good[npi+g]: bad[npi+g] = v
+            events += len(bad)
+            d = 0
+            for o in idx.pos(net):
+                if o in bad: d |= bad[o] ^ good[o]
+            if d:
+                detected[(net, sa)] = w * WORD_BITS + (d & -d).bit_length() - 1
+            else:
+                alive.append((net, sa))
+        remaining = alive
+    counters["gates"] += evals
+    counters["events"] += events
+    counters["words"] += evals
+    return detected
+
+# --jobs：整個 run 只開一個 pool，每個 worker 只收一次 (cnl, idx)；
+# 每個 chunk 只傳 shared memory 裡 good values 的 handle，由 _ppsfp_prepare 轉成 words/base。
+# codegen kernel 不能 pickle，由 worker 自己從 cache 載入
+def _ppsfp_setup(cnl, idx, kernel_args=None):
+    return cnl, idx, load_kernel(cnl, **kernel_args) if kernel_args else None
+
+def _ppsfp_prepare(state, good_ref, n):
+    cnl, idx, kernel = state
+    base = attach(good_ref).T.tolist()
+    words = [(mask, col[:cnl.n_pis]) for mask, col in zip(valid_mask(n).tolist(), base)]
+    return cnl, idx, words, base, kernel
+
+def _ppsfp_task(state, faults):
+    cnl, idx, words, base, kernel = state
+    return detect_faults_ppsfp(cnl, idx, words, base, faults, kernel)
 
 def circuit_stats(name, inputs, outputs, gates):
     # cells
@@ -96,20 +147,44 @@ def circuit_stats(name, inputs, outputs, gates):
 
 def main():
     ap = argparse.ArgumentParser(description="Stuck-at fault simulator (純 Python)")
-    ap.add_argument("bench"), ap.add_argument("tests")
+    ap.add_argument("bench"), ap.add_argument("tests", nargs="?", help=".tests 或 .tpk 檔（或改用 --random）")
+    ap.add_argument("--no-cache", action="store_true", help="always re-parse the bench file")
+    ap.add_argument("--jobs", type=int, default=1, help="worker processes for the fault list (0 = all cores)")
+    ap.add_argument("--chunk", type=int, default=CHUNK, help="test vectors read and simulated per chunk")
+    ap.add_argument("--codegen", action="store_true",
+                    help="simulate the good machine and propagate faults with per-circuit generated code "
+                         "(fsim.codegen, cached by bench hash)")
+    ap.add_argument("--untestable", action="store_true",
+                    help="prove faults untestable before simulation (fsim.redundancy), "
+                         "never simulate them and also report the testable coverage")
+    add_arguments(ap)
+    add_coverage_arguments(ap)
+    add_random_arguments(ap)
     args = ap.parse_args()
-    bench_p, tests_p = Path(args.bench), Path(args.tests)
+    check_arguments(ap, args)
+    sampler = start_sampler(args.sample)
+    bench_p = Path(args.bench)
 
+    phases = Phases()
     log("Loading bench & tests...")
-    inputs, outputs, gates = parse_bench(bench_p)
-    tests = [l.strip() for l in tests_p.read_text(encoding='utf-8').splitlines() if l.strip()]
+    with phases("parse"):
+        cnl, timings = load_netlist(bench_p, use_cache=not args.no_cache)
+    inputs = cnl.names[:cnl.n_pis]
+    outputs = [cnl.names[p] for p in cnl.pos.tolist()]
+    gates = list(cnl.iter_gates())
+    log(", ".join(f"{k.capitalize()} {v:.3f} s" for k, v in timings.items()))
+    with phases("parse"):
+        idx = ConeIndex(cnl)
+    kernel_args, kernel = None, None
+    if args.codegen:
+        kernel_args = dict(bench=bench_p, faults=True, use_cache=not args.no_cache)
+        with phases("parse"):
+            kernel = load_kernel(cnl, **kernel_args)
+        log(f"Codegen kernel: {len(kernel.CONES)} / {cnl.n_nets} fault cones")
 
     stats = circuit_stats(bench_p.name, inputs, outputs, gates)
     log(f'Circuit {{name: "{stats["name"]}", cells: {stats["cells"]}, forks: {stats["forks"]}, '
         f'lines: {stats["lines"]}, io_nodes: {stats["io_nodes"]}}}')
-    log(f'TestDataShape ({len(tests)}, {len(inputs)})')
-
-    order  = topo_order(inputs, gates)
 
     # 可能 fault 的 net ＝ 所有 nets（I/O + gate out + gate in）
     out_nets = [o for o,_,_ in gates]
@@ -119,27 +194,109 @@ def main():
     log(f"Total possible faults: {total_possible_faults}")
 
     log("Performing fault simulation...")
-    base   = simulate_baseline(inputs, outputs, order, tests)
-
-    detected = []
     # I/O + gate outputs 作為 fault 加入點
     nets_for_faults = sorted(set(inputs) | set(outputs) | set(out_nets))
     faults = [(n,0) for n in nets_for_faults] + [(n,1) for n in nets_for_faults]
 
-    for n,sa in faults:
-        if detect_fault(inputs, outputs, order, tests, base, n, sa):
-            detected.append((n,sa))
+    # baseline（所有 net 的 fault-free 值）：golden cache 有就直接 mmap，
+    # 沒有就把 tests 以 chunk 串流讀入（mmap）模擬後寫進 cache；
+    # --random 則邊產生向量邊逐 chunk 模擬，不經過 .tests 檔
+    step = chunk_size(args.chunk)
+    if args.random:
+        n_tests = args.random
+        log(f"Random tests: up to {n_tests} vectors, seed {args.seed}")
+
+        def chunks():
+            plan = kernel or LevelPlan(cnl)
+            for planes, n in iter_random(len(inputs), n_tests, args.seed, step):
+                with phases("good"):
+                    base = simulate_baseline(plan, planes, n)
+                yield base, n
+    else:
+        tests_p = Path(args.tests)
+        n_tests = count_patterns(tests_p)
+        log(f'TestDataShape ({n_tests}, {len(inputs)})')
+
+        def fill(out):
+            w0, plan = 0, kernel or LevelPlan(cnl)
+            for planes, n in iter_patterns(tests_p, len(inputs), args.chunk, bench_p):
+                base = simulate_baseline(plan, planes, n)
+                out[:, w0:w0+base.shape[1]] = base
+                w0 += base.shape[1]
+
+        with phases("good"):
+            golden, golden_hit = cached_golden(bench_p, tests_p, "nets", (cnl.n_nets, (n_tests + WORD_BITS - 1) // WORD_BITS),
+                                               fill, use_cache=not args.no_cache)
+        log(f"Golden {'from cache' if golden_hit else 'simulated'}")
+
+        def chunks():
+            for t0 in range(0, n_tests, step):
+                n = min(step, n_tests - t0)
+                yield golden[:, t0 // WORD_BITS:(t0 + n + WORD_BITS - 1) // WORD_BITS], n
+
+    # 每個 chunk 只模擬還沒被偵測到的 faults
+    ids = [(cnl.net_id(n), sa) for n, sa in faults]
+    hit = {}  # fault -> 第一個偵測到它的 vector
+    # --untestable：模擬前先證明不可測的 faults，它們一次都不模擬
+    untestable = set()
+    if args.untestable:
+        with phases("static"):
+            red = Redundancy(cnl, idx)
+            untestable = {f for f in ids if red.stem(*f)}
+        log(f"Untestable faults (static): {len(untestable)}")
+    cov = Coverage(len(faults), args.target_coverage, args.plateau)
+    useful = Useful(cnl.n_pis)  # --save-useful：第一個偵測到某個 fault 的向量
+    simulated = 0
+    n_words = min(step, n_tests + WORD_BITS - 1) // WORD_BITS  # 最大的 chunk
+    with profiled(args.profile), SharedBuffer(cnl.n_nets * n_words * 8, args.jobs) as buf, \
+            FaultPool(args.jobs, _ppsfp_setup, (cnl, idx, kernel_args), _ppsfp_task, _ppsfp_prepare) as pool:
+        for good, n in chunks():
+            t0 = simulated
+            todo = [f for f in ids if f not in hit and f not in untestable]
+            if not todo:
+                break
+            first = []
+            with phases("fault"):
+                for part in pool.map(todo, buf.put(good), n):
+                    hit.update((f, t0 + t) for f, t in part.items())
+                    first += part.values()
+            if args.save_useful:
+                useful.add(good[:cnl.n_pis], first)
+            record_batch(n, len(todo), len(todo) - sum(f not in hit for f in todo))
+            simulated = t0 + n
+            # --target-coverage / --plateau：coverage 夠了或不再上升就不模擬後面的 chunks
+            if cov.update(simulated, len(hit)):
+                log(f"Stopped early: {cov.reason} (of {n_tests})")
+                break
+    detected = [(n, sa) for n, sa in faults if (cnl.net_id(n), sa) in hit]
 
     total = len(faults)
     log(f"TotalFaults {total}")
     log(f"DetectedFaults {len(detected)}")
     log(f"FaultCoverage {len(detected)/total*100:.2f}%")
+    if args.untestable:
+        testable = total - len(untestable)
+        log(f"TestableFaults {testable}")
+        log(f"TestableCoverage {len(detected)/testable*100 if testable else 100.0:.2f}%")
 
     out = bench_p.with_suffix('.detected.txt')
     with open(out, 'w', encoding='utf-8') as f:
         for n, sa in detected:
             f.write(f"{n}/SA{sa}\n")
     log(f"Detected list -> {out}")
+    if args.save_useful:
+        if useful.save(args.save_useful, bench_p):
+            log(f"Useful vectors: {useful.count} of {simulated} -> {args.save_useful}")
+        else:
+            log(f"Useful vectors: none, {args.save_useful} not written")
+    log(f"Counters: {summary()}")
+    if sampler:
+        sampler.stop()
+        log("Samples: " + sampler.format())
+    report(phases, faults=total, detected=len(detected), vectors=simulated)
+    write_curve(args.curve, hit.values(), total, simulated)
+    report_faults([fault_name(site_name(n), sa) for n, sa in faults],
+                  [fault_name(site_name(n), sa) for n, sa in detected])
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,39 @@
+import os
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+DATA = ROOT / 'data.nogit'
+sys.path.insert(0, str(ROOT))
+
+from fsim.verify import FAULTS_ENV, load_faults  # noqa: E402
+
+TEAMS = {
+    'A': 'team_A/3_stuck_at_fault_simulator.py',
+    'B': 'team_B/3_stuck_at_fault_simulator.py',
+    'C': 'team_C/3_stuck_at_fault_simulator_3_teamC.py',
+}
+
+
+@pytest.fixture
+def circuit(tmp_path):
+    """Copy ``data.nogit/<name>.bench`` and ``.tests`` to ``tmp_path``; returns ``(bench, tests)``."""
+    def copy(name):
+        return tuple(Path(shutil.copy(DATA / f'{name}{ext}', tmp_path)) for ext in ('.bench', '.tests'))
+    return copy
+
+
+@pytest.fixture
+def run_team(tmp_path):
+    """Run a team script with a private cache; returns its canonical ``(universe, detected)``."""
+    def run(team, bench, tests, *args):
+        faults = tmp_path / f'{team}.{len(list(tmp_path.glob("*.json")))}.json'
+        env = dict(os.environ, FSIM_CACHE_DIR=str(tmp_path / 'cache'), **{FAULTS_ENV: str(faults)})
+        subprocess.run([sys.executable, TEAMS[team], str(bench), str(tests), *args],
+                       cwd=ROOT, env=env, check=True, capture_output=True)
+        return load_faults(faults)
+    return run
@@ -0,0 +1,20 @@
+import pytest
+
+
+@pytest.mark.parametrize('team', ['A', 'B'])
+@pytest.mark.parametrize('name', ['c17', 'c432'])
+def test_equiv_matches_uncollapsed(team, name, circuit, run_team):
+    bench, tests = circuit(name)
+    full = run_team(team, bench, tests, '--collapse', 'none')
+    equiv = run_team(team, bench, tests, '--collapse', 'equiv')
+    assert equiv[0] == full[0]
+    assert sorted(equiv[1] ^ full[1]) == []
+
+
+@pytest.mark.parametrize('team', ['A', 'B'])
+def test_dominance_is_lower_bound(team, circuit, run_team):
+    bench, tests = circuit('c432')
+    full = run_team(team, bench, tests, '--collapse', 'none')
+    dominance = run_team(team, bench, tests, '--collapse', 'dominance')
+    assert dominance[0] == full[0]
+    assert sorted(dominance[1] - full[1]) == []
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from fsim.benchmark import make_tests
+from fsim.cache import load_netlist
+from fsim.codegen import load_kernel
+from fsim.levelsim import LevelPlan
+from fsim.patterns import iter_patterns, valid_mask
+from fsim.verify import Reference, fault_name, site_name
+
+N_VECS = 300  # not a multiple of 64, so the padding bits are exercised too
+
+
+@pytest.fixture(params=['c17', 'c432', 'c880'])
+def reference(request, circuit, tmp_path):
+    """``(cnl, bench, tests, Reference)`` on ``N_VECS`` random vectors."""
+    bench, _ = circuit(request.param)
+    cnl = load_netlist(bench, use_cache=False)[0]
+    tests = tmp_path / f'{request.param}.{N_VECS}.tests'
+    make_tests(bench, N_VECS, tests)
+    return cnl, bench, tests, Reference(cnl, tests, bench)
+
+
+def as_ints(words):
+    """Rows of uint64 words as Python ints, bit ``t`` for vector ``t``."""
+    return [int.from_bytes(row.tobytes(), 'little') for row in np.ascontiguousarray(words, dtype='<u8')]
+
+
+def test_levelsim_good_values(reference):
+    cnl, bench, tests, ref = reference
+    plan = LevelPlan(cnl)
+    vals = np.concatenate([plan.simulate(planes) & valid_mask(n)
+                           for planes, n in iter_patterns(tests, cnl.n_pis, 128, bench)], axis=1)
+    assert as_ints(vals) == ref.good
+
+
+def test_codegen_good_values(reference):
+    cnl, bench, tests, ref = reference
+    kernel = load_kernel(cnl, bench, use_cache=False)
+    assert list(kernel.simulate(ref.pi_rows, ref.mask)) == ref.good
+    words = np.concatenate([p for p, _ in iter_patterns(tests, cnl.n_pis, 128, bench)], axis=1)
+    vals = np.stack(kernel.simulate(list(words), ~np.uint64(0))) & valid_mask(N_VECS)
+    assert as_ints(vals) == ref.good
+
+
+def test_codegen_cones_detect_stem_faults(reference):
+    cnl, bench, tests, ref = reference
+    kernel = load_kernel(cnl, bench, faults=True, use_cache=False)
+    assert kernel.CONES
+    for net, cone in kernel.CONES.items():
+        for sa in (0, 1):
+            name = fault_name(site_name(cnl.names[net]), sa)
+            assert cone(ref.good, ref.mask if sa else 0, ref.mask) == ref.detecting(name), name
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from fsim.patterns import (WORD_BITS, count_patterns, iter_packed, iter_patterns, iter_tests, pack_file,
+                           save_patterns, unpack_file)
+
+N_PIS, N_POS, N_VECS, CHUNK = 5, 2, 150, 100  # CHUNK is not a multiple of 64
+
+
+@pytest.fixture
+def vectors(tmp_path):
+    """``(bits, path)``: random vectors and a ``.tests`` file of them with ``--`` placeholders."""
+    bits = np.random.default_rng(1).integers(0, 2, size=(N_VECS, N_PIS), dtype=np.uint8)
+    path = tmp_path / 'v.tests'
+    path.write_bytes(b''.join(bytes(row + ord('0')) + b'-' * N_POS + b'\n' for row in bits))
+    return bits, path
+
+
+def unpack(chunks):
+    """Concatenated ``(vectors, n_pis)`` bits of ``(planes, n)`` chunks, checking their padding."""
+    out = []
+    for planes, n in chunks:
+        assert planes.shape[1] == (n + WORD_BITS - 1) // WORD_BITS
+        bits = np.unpackbits(np.ascontiguousarray(planes).view(np.uint8), axis=1, bitorder='little')
+        assert not bits[:, n:].any()
+        out.append(bits[:, :n].T)
+    return np.concatenate(out)
+
+
+def test_iter_tests(vectors):
+    bits, path = vectors
+    sizes = [n for _, n in iter_tests(path, N_PIS, CHUNK)]
+    assert sizes == [128, N_VECS - 128]
+    assert np.array_equal(unpack(iter_tests(path, N_PIS, CHUNK)), bits)
+
+
+def test_iter_tests_rejects_short_vectors(tmp_path):
+    path = tmp_path / 'short.tests'
+    path.write_bytes(b'01010--\n010\n')
+    with pytest.raises(ValueError, match='vector 1'):
+        list(iter_tests(path, N_PIS))
+
+
+def test_pack_unpack_round_trip(vectors, tmp_path):
+    bits, path = vectors
+    tpk = tmp_path / 'v.tpk'
+    assert pack_file(path, tpk) == N_VECS  # PI count taken from the first line, not its '--'
+    assert count_patterns(tpk) == N_VECS
+    assert np.array_equal(unpack(iter_packed(tpk, N_PIS, CHUNK)), bits)
+    assert np.array_equal(unpack(iter_patterns(tpk, N_PIS, CHUNK)), bits)
+    back = tmp_path / 'back.tests'
+    unpack_file(tpk, back, N_POS)
+    assert back.read_bytes() == path.read_bytes()
+
+
+def test_pack_with_bench(circuit, tmp_path):
+    bench, tests = circuit('c17')
+    tpk = tmp_path / 'c17.tpk'
+    pack_file(tests, tpk, bench=bench)
+    assert np.array_equal(unpack(iter_patterns(tpk, 5, CHUNK, bench)), unpack(iter_tests(tests, 5, CHUNK)))
+    with pytest.raises(ValueError):
+        list(iter_packed(tpk, 6))
+
+
+@pytest.mark.parametrize('suffix', ['.tests', '.tpk'])
+def test_save_patterns(vectors, tmp_path, suffix):
+    bits, path = vectors
+    planes = np.concatenate([p for p, _ in iter_tests(path, N_PIS)], axis=1)
+    out = tmp_path / f'saved{suffix}'
+    save_patterns(out, planes, N_VECS - 7)
+    assert np.array_equal(unpack(iter_patterns(out, N_PIS, CHUNK)), bits[:N_VECS - 7])
@@ -0,0 +1,45 @@
+import itertools
+from collections import defaultdict
+
+import pytest
+
+from fsim.benchmark import make_tests
+from fsim.cache import load_netlist
+from fsim.redundancy import Redundancy
+from fsim.verify import Reference, fault_name, site_name
+
+
+def canonical_faults(cnl):
+    """Every fault of the canonical universe of fsim.verify on ``cnl``."""
+    names = cnl.names
+    branches = defaultdict(list)
+    for g in range(cnl.n_gates):
+        for pin, u in enumerate(cnl.gate_ins(g).tolist()):
+            branches[u].append(site_name(names[u], names[cnl.n_pis + g], pin))
+    for p in cnl.pos.tolist():
+        branches[p].append(site_name(names[p], 'PO'))
+    sites = []
+    for net in range(cnl.n_nets):
+        sites.append(site_name(names[net]))
+        if len(branches[net]) > 1:
+            sites += branches[net]
+    return [fault_name(s, sa) for s in sites for sa in (0, 1)]
+
+
+def exhaustive_tests(n_pis, path):
+    with open(path, 'w') as f:
+        f.writelines(''.join(bits) + '\n' for bits in itertools.product('01', repeat=n_pis))
+
+
+@pytest.mark.parametrize('name, n_vecs', [('c17', None), ('c432', 4096)])
+def test_untestable_faults_are_never_detected(name, n_vecs, circuit, tmp_path):
+    bench, _ = circuit(name)
+    cnl = load_netlist(bench, use_cache=False)[0]
+    tests = tmp_path / f'{name}.check.tests'
+    if n_vecs is None:
+        exhaustive_tests(cnl.n_pis, tests)
+    else:
+        make_tests(bench, n_vecs, tests)
+    red, ref = Redundancy(cnl), Reference(cnl, tests, bench)
+    proven = [f for f in canonical_faults(cnl) if red.fault(f)]
+    assert [f for f in proven if ref.detecting(f)] == []